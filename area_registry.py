@@ -0,0 +1,58 @@
+import json
+
+AREA_REGISTRY_PATH = "areas.json"
+
+class AreaSpec:
+    """
+    Описание образовательной области из areas.json: как искать методики в базе знаний
+    и из чего собирать промпт. Статичные части промпта склеиваются один раз при загрузке,
+    для каждой ячейки подставляются только месяц, темы плана и найденный контекст.
+    """
+
+    def __init__(self, name, query_template, k, min_score, role, plan_fields, materials, instructions):
+        self.name = name
+        self.query_template = query_template
+        self.k = k
+        self.min_score = min_score
+        self.plan_fields = [(f["label"], f["field"], f.get("empty", "")) for f in plan_fields]
+
+        numbered_instructions = "\n".join(f"{i}.  {line}" for i, line in enumerate(instructions, start=1))
+        self._prompt_head = (
+            f"\nТЫ — {role}, который составляет план занятия СТРОГО ПО ЗАДАННОМУ УЧЕБНОМУ ПЛАНУ.\n"
+            "ТВОЕ ТЕХНИЧЕСКОЕ ЗАДАНИЕ НА ЭТОТ МЕСЯЦ ("
+        )
+        self._materials_head = f"---\nОПОРНЫЕ МАТЕРИАЛЫ ({materials}):\n---\n"
+        self._prompt_tail = (
+            f"\n---\nИНСТРУКЦИИ ПО ГЕНЕРАЦИИ:\n{numbered_instructions}\n"
+            "ПРЕДОСТАВЬ ГОТОВЫЙ, ДЕТАЛЬНЫЙ ТЕКСТ ДЛЯ ЯЧЕЙКИ, ВЫПОЛНЕННЫЙ ПО ТЕХНИЧЕСКОМУ ЗАДАНИЮ:\n"
+        )
+
+    def build_queries(self, age_group, topics):
+        """Поисковые запросы к базе знаний, по одному на тему."""
+        return [self.query_template.format(age_group=age_group, topic=topic) for topic in topics]
+
+    def render_prompt(self, context, month, monthly_plan):
+        plan_lines = "".join(
+            f"- {label}: {', '.join(monthly_plan.get(field, [])) or empty}\n"
+            for label, field, empty in self.plan_fields
+        )
+        # Контекст и темы вставляются конкатенацией: фигурные скобки в них не должны разбираться как шаблон.
+        return self._prompt_head + month + "):\n---\n" + plan_lines + self._materials_head + context + self._prompt_tail
+
+def load_area_registry(path=AREA_REGISTRY_PATH):
+    """Загружает реестр областей: {название области из curriculum_map.json: AreaSpec}."""
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    return {
+        entry["name"]: AreaSpec(
+            name=entry["name"],
+            query_template=entry["search"]["query_template"],
+            k=entry["search"]["k"],
+            min_score=entry["search"]["min_score"],
+            role=entry["prompt"]["role"],
+            plan_fields=entry["prompt"]["plan_fields"],
+            materials=entry["prompt"]["materials"],
+            instructions=entry["prompt"]["instructions"],
+        )
+        for entry in entries
+    }
@@ -0,0 +1,208 @@
+import sys
+import json
+import time
+import argparse
+import threading
+from llm_cache import CacheMissError
+from retrieval import prefetch_plan_context
+from resources import ResourceManager
+from area_registry import load_area_registry
+from run_journal import open_run_journal, safe_group_name
+from generation_engine import ALL_MONTHS, clean_text, collect_plan_cells, generate_cells_concurrently, iter_table_rows
+from run_metrics import RunMetrics, build_cell_metrics
+from plan_renderers import RENDERERS, parse_output_formats, write_plan_outputs
+from main_generator import GENERATIVE_MODEL_NAME
+
+YEAR = "2025-2026"
+COMBINED_OUTPUT_BASENAME = "Годовой_Перспективный_план_все_группы"
+
+def resolve_age_groups(selectors, curriculum_map):
+    """
+    Переводит аргументы командной строки в названия групп из curriculum_map.json.
+    Группу можно указать номером (с 1, в порядке карты), полным названием или его началом.
+    """
+    names = list(curriculum_map)
+    groups = []
+    for selector in selectors:
+        if selector.isdigit() and 1 <= int(selector) <= len(names):
+            matches = [names[int(selector) - 1]]
+        else:
+            matches = [name for name in names if name == selector] or [name for name in names if name.lower().startswith(selector.lower())]
+        if len(matches) != 1:
+            raise ValueError(f"Группа '{selector}' не найдена или указана неоднозначно. Доступные группы: {', '.join(names)}")
+        if matches[0] not in groups:
+            groups.append(matches[0])
+    return groups
+
+def run_batch_generation(age_groups, resume=False, resources=None, curriculum_path="curriculum_map.json", combined_path=None, formats=None):
+    """
+    Генерирует планы для нескольких возрастных групп в одном процессе.
+    Модели и индекс загружаются один раз, ячейки всех групп идут в общий пул
+    generate_cells_concurrently, поэтому общее время близко ко времени самой
+    долгой группы, а не к сумме. Для каждой группы ведется свой журнал прогона
+    и сохраняются свои файлы плана в форматах formats (по умолчанию из OUTPUT_FORMATS).
+    Если задан combined_path (имя без расширения), все группы дополнительно
+    пишутся в один общий план. Возвращает {группа: [имена файлов]}.
+    Если ячейка группы не сгенерировалась, остальные группы доводятся до конца,
+    а у этой группы файлы не сохраняются и прогон не отмечается завершенным:
+    готовые ячейки остаются в журнале, и --resume догенерирует только упавшие.
+    В конце такие группы перечисляются в RuntimeError.
+    """
+    # Журналов у пакета несколько, поэтому время этапов и сводка идут в консоль, а показатели ячеек — в журнал своей группы.
+    run_metrics = RunMetrics()
+    resources = resources or ResourceManager(GENERATIVE_MODEL_NAME)
+    with run_metrics.stage("models"):
+        embedding_model, faiss_index, documents, generative_model = resources.get()
+    if not all((embedding_model, faiss_index, documents, generative_model)):
+        raise RuntimeError("Ошибка инициализации моделей или базы знаний.")
+
+    with open(curriculum_path, "r", encoding="utf-8") as f:
+        curriculum_map = json.load(f)
+    areas = load_area_registry()
+
+    journals = {}
+    group_cells = {}
+    contexts = {}
+    context_stats = {}
+    completed_cells = {}
+    failed_cells = {}
+    failed_lock = threading.Lock()
+    for age_group in age_groups:
+        plan_for_age_group = curriculum_map.get(age_group)
+        if not plan_for_age_group:
+            raise ValueError(f"Не найдена программа для группы '{age_group}'")
+        cells = collect_plan_cells(plan_for_age_group, ALL_MONTHS)
+        journal = open_run_journal(age_group, resume=resume)
+        pending_cells = [cell for cell in cells if (cell[0], cell[1]) not in journal.completed_cells]
+        print(f"Группа '{age_group}': ячеек {len(cells)}, к генерации {len(pending_cells)}.")
+        group_stats = {}
+        with run_metrics.stage("retrieval"), run_metrics.count_delta(getattr(embedding_model, "cache", None), ("hits", "misses"), "embedding_cache"):
+            group_contexts = prefetch_plan_context(pending_cells, areas, age_group, embedding_model, faiss_index, documents, cell_stats=group_stats)
+
+        journals[age_group] = journal
+        group_cells[age_group] = cells
+        for (month, area), context in group_contexts.items():
+            contexts[(age_group, month, area)] = context
+            context_stats[(age_group, month, area)] = group_stats[(month, area)]
+        for (month, area), content in journal.completed_cells.items():
+            completed_cells[(age_group, month, area)] = content
+
+    def generate_cell(age_group, month, area, monthly_plan):
+        area_spec = areas.get(area)
+        if area_spec is None or (age_group, month, area) not in contexts:
+            print(f"ПРЕДУПРЕЖДЕНИЕ: Область '{area}' не описана в areas.json.")
+            return "Описание области не найдено."
+
+        try:
+            prompt = area_spec.render_prompt(contexts[(age_group, month, area)], month, monthly_plan)
+            started_at = time.perf_counter()
+            response = generative_model.generate_content(prompt)
+            generation_seconds = time.perf_counter() - started_at
+            cell_content = clean_text(response.text)
+            cell_metrics = build_cell_metrics(prompt, response, context_stats[(age_group, month, area)], generation_seconds=generation_seconds)
+            run_metrics.add_cell(f"{age_group} / {month}", area, cell_metrics)
+            journals[age_group].record_cell(month, area, cell_content, metrics=cell_metrics)
+            return cell_content
+        except CacheMissError:
+            raise
+        except Exception as e:
+            print(f"ОШИБКА при генерации ячейки '{age_group} / {month} / {area}': {e}")
+            with failed_lock:
+                failed_cells.setdefault(age_group, []).append((month, area))
+            return None
+
+    def on_cell_done(cell, completed, total):
+        age_group, month, area, _ = cell
+        if (month, area) in failed_cells.get(age_group, ()):
+            return
+        print(f"Ячейка сгенерирована ({completed}/{total}): {age_group} / {month} / {area}")
+
+    pooled_cells = [(age_group,) + cell for age_group in age_groups for cell in group_cells[age_group]]
+    print(f"\nНачало пакетной генерации: групп {len(age_groups)}, ячеек {len(pooled_cells)}, "
+          f"уже готово {len(completed_cells)}.\n")
+    with run_metrics.stage("generation"), run_metrics.count_delta(generative_model, ("retries", "throttled", "failed"), "llm"):
+        contents = generate_cells_concurrently(pooled_cells, generate_cell, on_cell_done=on_cell_done, completed_cells=completed_cells)
+
+    plan_rows = {}
+    offset = 0
+    for age_group in age_groups:
+        cells = group_cells[age_group]
+        plan_rows[age_group] = list(iter_table_rows(cells, contents[offset:offset + len(cells)]))
+        offset += len(cells)
+
+    outputs = {}
+    for age_group in age_groups:
+        if age_group in failed_cells:
+            print(f"План для группы '{age_group}' не сохранен: не сгенерировано ячеек {len(failed_cells[age_group])}.")
+            continue
+        with run_metrics.stage("document"):
+            output_files = write_plan_outputs(f"Годовой_Перспективный_план_{safe_group_name(age_group)}", [(age_group, plan_rows[age_group])], YEAR, formats)
+        journals[age_group].mark_finished(", ".join(output_files))
+        outputs[age_group] = output_files
+        print(f"План для группы '{age_group}' сохранен: {', '.join(output_files)}")
+
+    if combined_path and failed_cells:
+        print("Общий план не сохранен: не все группы сгенерированы.")
+    elif combined_path:
+        with run_metrics.stage("combined_document"):
+            output_files = write_plan_outputs(combined_path, [(age_group, plan_rows[age_group]) for age_group in age_groups], YEAR, formats)
+        print(f"Общий план для {len(age_groups)} групп сохранен: {', '.join(output_files)}")
+
+    if failed_cells:
+        print(f"\nПакетная генерация завершена с ошибками.\n{run_metrics.finish()}")
+        failed_groups = [age_group for age_group in age_groups if age_group in failed_cells]
+        raise RuntimeError(f"Не завершены группы: {', '.join(failed_groups)}. "
+                           "Запустите их снова с --resume, чтобы сгенерировать только оставшиеся ячейки.")
+    print(f"\nПакетная генерация завершена.\n{run_metrics.finish()}")
+    return outputs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная генерация годовых планов для нескольких возрастных групп в одном процессе.")
+    parser.add_argument("groups", nargs="*", help="номера групп (с 1), их названия или начало названия")
+    parser.add_argument("--all", action="store_true", help="сгенерировать планы для всех групп из curriculum_map.json")
+    parser.add_argument("--resume", action="store_true", help="продолжить прерванные прогоны групп из папки runs/")
+    parser.add_argument("--list", action="store_true", help="показать доступные группы и выйти")
+    parser.add_argument("--combined", nargs="?", const=COMBINED_OUTPUT_BASENAME, metavar="ИМЯ",
+                        help=f"дополнительно сохранить все группы в один план (имя без расширения, по умолчанию {COMBINED_OUTPUT_BASENAME})")
+    parser.add_argument("--formats", help=f"форматы вывода через запятую: {', '.join(RENDERERS)} (по умолчанию OUTPUT_FORMATS из .env или docx)")
+    args = parser.parse_args(argv)
+
+    try:
+        with open("curriculum_map.json", "r", encoding="utf-8") as f:
+            curriculum_map = json.load(f)
+    except FileNotFoundError:
+        print("ОШИБКА: Файл 'curriculum_map.json' не найден.")
+        return 1
+
+    if args.list:
+        for number, name in enumerate(curriculum_map, start=1):
+            print(f"{number}. {name}")
+        return 0
+    if args.all:
+        age_groups = list(curriculum_map)
+    elif args.groups:
+        try:
+            age_groups = resolve_age_groups(args.groups, curriculum_map)
+        except ValueError as e:
+            print(f"ОШИБКА: {e}")
+            return 2
+    else:
+        parser.print_usage()
+        print("Укажите группы или --all.")
+        return 2
+
+    try:
+        formats = parse_output_formats(args.formats) if args.formats else None
+    except ValueError as e:
+        print(f"ОШИБКА: {e}")
+        return 2
+
+    try:
+        run_batch_generation(age_groups, resume=args.resume, combined_path=args.combined, formats=formats)
+    except (RuntimeError, ValueError) as e:
+        print(f"ОШИБКА: {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
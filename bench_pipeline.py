@@ -0,0 +1,411 @@
+import os
+import sys
+import json
+import math
+import time
+import queue
+import random
+import shutil
+import hashlib
+import threading
+import argparse
+import tempfile
+import platform
+import subprocess
+
+# Офлайн-бенчмарк конвейера: genai.GenerativeModel подменяется локальной моделью-заглушкой
+# с заданной задержкой, долей ошибок и размером ответа, поэтому замеры не тратят квоту Gemini и не зависят от сети.
+# Каждый сценарий идет в отдельном процессе: так пиковая память (RSS) относится только к нему.
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_RESULTS_DIR = os.path.join(REPO_DIR, "bench_results")
+SCENARIOS = ("build_index", "distiller", "generation", "batch")
+WORKDIR_INPUTS = ("curriculum_map.json", "areas.json", "final_docs", "pdfs")
+RESULT_PREFIX = "BENCH_RESULT "
+EMBEDDING_DIM = 384
+FILLER_SENTENCE = "Воспитатель предлагает детям рассмотреть иллюстрации, обсудить увиденное и выполнить практическое задание. "
+
+class MockUsageMetadata:
+    def __init__(self, prompt, text):
+        self.prompt_token_count = max(1, len(prompt) // 3)
+        self.candidates_token_count = max(1, len(text) // 3)
+        self.total_token_count = self.prompt_token_count + self.candidates_token_count
+
+class MockResponse:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+class ServiceUnavailable(Exception):
+    """Имитация 503: имя и code совпадают с google.api_core, чтобы ее повторял llm_client."""
+    code = 503
+
+class ResourceExhausted(Exception):
+    """Имитация 429 (превышение квоты)."""
+    code = 429
+
+def make_mock_model_class(config):
+    """
+    Класс-заглушка с интерфейсом genai.GenerativeModel. Задержка ответа логнормальная
+    с медианой latency_ms; при stream=True первый фрагмент приходит через ttft_fraction
+    этой задержки, остальное — равными частями. Ошибки 503 и 429 возникают до ответа.
+    """
+    rng = random.Random(config["seed"])
+    rng_lock = threading.Lock()
+    calls = []
+
+    def draw():
+        with rng_lock:
+            latency = config["latency_ms"] / 1000 * rng.lognormvariate(0, config["latency_sigma"])
+            roll = rng.random()
+            size = max(1, int(rng.gauss(config["response_chars"], config["response_chars"] * 0.2)))
+        return latency, roll, size
+
+    class MockGenerativeModel:
+        def __init__(self, model_name, **kwargs):
+            self.model_name = f"models/{model_name}"
+
+        def _prepare(self, prompt):
+            latency, roll, size = draw()
+            calls.append(latency)
+            if roll < config["throttle_rate"]:
+                time.sleep(latency * config["ttft_fraction"])
+                raise ResourceExhausted("429 Resource has been exhausted (mock)")
+            if roll < config["throttle_rate"] + config["error_rate"]:
+                time.sleep(latency * config["ttft_fraction"])
+                raise ServiceUnavailable("503 The service is currently unavailable (mock)")
+            digest = hashlib.md5(str(prompt).encode("utf-8")).hexdigest()[:8]
+            text = f"Ответ {digest}. " + (FILLER_SENTENCE * (size // len(FILLER_SENTENCE) + 1))[:size]
+            return latency, text
+
+        def generate_content(self, prompt, stream=False, **kwargs):
+            latency, text = self._prepare(prompt)
+            if not stream:
+                time.sleep(latency)
+                return MockResponse(text, MockUsageMetadata(str(prompt), text))
+            return self._stream(str(prompt), latency, text)
+
+        def _stream(self, prompt, latency, text):
+            chunks = config["stream_chunks"]
+            step = max(1, len(text) // chunks)
+            pieces = [text[i:i + step] for i in range(0, len(text), step)]
+            time.sleep(latency * config["ttft_fraction"])
+            for i, piece in enumerate(pieces):
+                if i:
+                    time.sleep(latency * (1 - config["ttft_fraction"]) / max(1, len(pieces) - 1))
+                usage = MockUsageMetadata(prompt, text) if i == len(pieces) - 1 else None
+                yield MockResponse(piece, usage)
+
+    MockGenerativeModel.calls = calls
+    return MockGenerativeModel
+
+class HashEmbeddingModel:
+    """Заглушка SentenceTransformer для --mock-embeddings: детерминированные единичные векторы по хэшу текста."""
+
+    def __init__(self, model_name, **kwargs):
+        self.model_name = model_name
+
+    def encode(self, texts, show_progress_bar=False, **kwargs):
+        import numpy as np
+
+        single = isinstance(texts, str)
+        vectors = []
+        for text in [texts] if single else texts:
+            seed = int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:4], "little")
+            vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIM).astype("float32")
+            vectors.append(vector / np.linalg.norm(vector))
+        result = np.stack(vectors) if vectors else np.empty((0, EMBEDDING_DIM), dtype="float32")
+        return result[0] if single else result
+
+def percentile(values, fraction):
+    """Перцентиль по ближайшему рангу; None для пустого списка."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    # Ранг — ceil(fraction * n); округление до 9 знаков убирает ошибку float вроде 0.95 * 60 = 57.00000000000001.
+    index = min(len(ordered) - 1, max(0, math.ceil(round(fraction * len(ordered), 9)) - 1))
+    return ordered[index]
+
+def latency_stats(values):
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 0.5), 3) if values else None,
+        "p95": round(percentile(values, 0.95), 3) if values else None,
+        "max": round(max(values), 3) if values else None,
+    }
+
+def peak_rss_mb():
+    """Пиковый RSS текущего процесса в МБ."""
+    try:
+        import resource
+    except ImportError:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / 2 ** 20, 1)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает килобайты, macOS — байты.
+    return round(peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
+
+def install_mocks(config):
+    """Подменяет Gemini (и при --mock-embeddings модель эмбеддингов) до импорта модулей конвейера."""
+    os.environ["GEMINI_API_KEY"] = "offline-benchmark"
+    os.environ["LLM_CACHE_MODE"] = "off"
+    import google.generativeai as genai
+
+    mock_class = make_mock_model_class(config)
+    genai.GenerativeModel = mock_class
+    genai.configure = lambda **kwargs: None
+    if config["mock_embeddings"]:
+        import sentence_transformers
+        sentence_transformers.SentenceTransformer = HashEmbeddingModel
+    return mock_class
+
+def read_journal_cells(paths):
+    """Показатели ячеек и сводки из журналов прогонов."""
+    cells, summaries = [], []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get("type") == "cell" and "metrics" in record:
+                    cells.append(record["metrics"])
+                elif record.get("type") == "summary":
+                    summaries.append(record)
+    return cells, summaries
+
+def list_journals():
+    if not os.path.isdir("runs"):
+        return set()
+    return {os.path.join(root, name) for root, _, files in os.walk("runs") for name in files if name.endswith(".jsonl")}
+
+def generation_result(started_at, journals_before, calls):
+    seconds = time.perf_counter() - started_at
+    cells, summaries = read_journal_cells(sorted(list_journals() - journals_before))
+    result = {
+        "seconds": round(seconds, 3),
+        "cells": len(cells),
+        "throughput_per_second": round(len(cells) / seconds, 3) if seconds else None,
+        "cell_latency": latency_stats([cell["generation_seconds"] for cell in cells if "generation_seconds" in cell]),
+        "time_to_first_token": latency_stats([cell["time_to_first_token"] for cell in cells if "time_to_first_token" in cell]),
+        "prompt_tokens": sum(cell.get("prompt_tokens", 0) for cell in cells),
+        "response_tokens": sum(cell.get("response_tokens", 0) for cell in cells),
+        "llm_calls": len(calls),
+        "unit": "ячеек",
+    }
+    if summaries:
+        result["stages"] = summaries[-1]["stages"]
+    return result
+
+def run_scenario(name, config):
+    """Выполняется в дочернем процессе, рабочая папка — временная копия входных данных."""
+    mock_class = install_mocks(config)
+    started_at = time.perf_counter()
+
+    if name == "build_index":
+        import faiss
+        import build_index
+
+        build_index.main()
+        seconds = time.perf_counter() - started_at
+        chunks = faiss.read_index(build_index.FAISS_INDEX_PATH).ntotal
+        result = {"seconds": round(seconds, 3), "chunks": chunks, "throughput_per_second": round(chunks / seconds, 3), "unit": "чанков"}
+
+    elif name == "distiller":
+        import distiller
+
+        # Конспекты заглушки не должны подменить настоящие тексты, по которым строится индекс.
+        distiller.DISTILLED_TXT_DIR = "bench_distilled/"
+        max_workers = distiller.get_max_concurrent_chunks()
+        os.makedirs(distiller.DISTILLED_TXT_DIR, exist_ok=True)
+        model = distiller.setup_distiller(max_workers)
+        pdf_files = [f for f in os.listdir(distiller.SOURCE_PDF_DIR) if f.endswith(".pdf")]
+        distiller.distill_pdfs(model, pdf_files, max_workers, distiller.load_manifest())
+        seconds = time.perf_counter() - started_at
+        calls = mock_class.calls
+        result = {
+            "seconds": round(seconds, 3),
+            "pdfs": len(pdf_files),
+            "chunks": len(calls),
+            "throughput_per_second": round(len(calls) / seconds, 3) if seconds else None,
+            "llm_latency": latency_stats(calls),
+            "unit": "кусков",
+        }
+
+    elif name.startswith("generation:"):
+        import plan_generation
+
+        age_group = name.split(":", 1)[1]
+        journals_before = list_journals()
+        update_queue = queue.Queue()
+        plan_generation.run_generation_process(age_group, update_queue)
+        messages = []
+        while not update_queue.empty():
+            messages.append(update_queue.get())
+        errors = [data for kind, data in messages if kind == "error"]
+        if errors:
+            raise RuntimeError(errors[0])
+        result = generation_result(started_at, journals_before, mock_class.calls)
+
+    elif name == "batch":
+        import batch_generator
+
+        journals_before = list_journals()
+        batch_generator.run_batch_generation(config["groups"])
+        result = generation_result(started_at, journals_before, mock_class.calls)
+
+    else:
+        raise ValueError(f"Неизвестный сценарий: {name}")
+
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+def prepare_workdir():
+    workdir = tempfile.mkdtemp(prefix="plan_bench_")
+    for name in WORKDIR_INPUTS:
+        source = os.path.join(REPO_DIR, name)
+        if os.path.isdir(source):
+            shutil.copytree(source, os.path.join(workdir, name))
+        elif os.path.exists(source):
+            shutil.copy2(source, workdir)
+    return workdir
+
+def run_child(name, config, workdir):
+    """Запускает сценарий в дочернем процессе и возвращает его результат."""
+    log_path = os.path.join(workdir, f"{name.replace(':', '_').replace(' ', '_')}.log")
+    command = [sys.executable, os.path.abspath(__file__), "--run-scenario", name, "--config", json.dumps(config)]
+    with open(log_path, "w", encoding="utf-8") as log:
+        completed = subprocess.run(command, cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding="utf-8")
+        log.write(completed.stdout)
+    lines = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_PREFIX)]
+    if completed.returncode != 0 or not lines:
+        tail = "\n".join(completed.stdout.splitlines()[-15:])
+        return {"error": f"код выхода {completed.returncode}, лог: {log_path}\n{tail}"}
+    return json.loads(lines[-1][len(RESULT_PREFIX):])
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def latest_result_file(results_dir):
+    if not os.path.isdir(results_dir):
+        return None
+    files = sorted(f for f in os.listdir(results_dir) if f.endswith(".json"))
+    return os.path.join(results_dir, files[-1]) if files else None
+
+def format_scenario(name, result, previous=None):
+    if "error" in result:
+        return f"{name}: ОШИБКА {result['error']}"
+    parts = [f"{result['seconds']:.1f} с", f"{result['throughput_per_second']} {result['unit']}/с", f"пик RSS {result['peak_rss_mb']} МБ"]
+    latency = result.get("cell_latency") or result.get("llm_latency")
+    if latency and latency["count"]:
+        parts.append(f"задержка p50 {latency['p50']} с, p95 {latency['p95']} с")
+    line = f"{name}: " + ", ".join(parts)
+    if previous and "error" not in previous and previous.get("seconds"):
+        change = (result["seconds"] - previous["seconds"]) / previous["seconds"] * 100
+        line += f" [{change:+.0f}% ко времени прошлого замера]"
+    return line
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк конвейера с локальной заглушкой Gemini.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"через запятую из: {', '.join(SCENARIOS)}")
+    parser.add_argument("--groups", nargs="*", help="номера, названия или начало названий групп (по умолчанию все из curriculum_map.json)")
+    parser.add_argument("--latency-ms", type=float, default=800, help="медиана задержки ответа заглушки")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="разброс задержки (sigma логнормального распределения)")
+    parser.add_argument("--ttft-fraction", type=float, default=0.25, help="доля задержки до первого фрагмента при потоковой выдаче")
+    parser.add_argument("--stream-chunks", type=int, default=8, help="число фрагментов потокового ответа")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--response-chars", type=int, default=1500, help="средний размер ответа в символах")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mock-embeddings", action="store_true", help="заменить модель эмбеддингов хэш-векторами (без загрузки модели)")
+    parser.add_argument("--results-dir", default=BENCH_RESULTS_DIR)
+    parser.add_argument("--keep-workdir", action="store_true", help="не удалять временную рабочую папку с логами сценариев")
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--config", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        result = run_scenario(args.run_scenario, json.loads(args.config))
+        print(RESULT_PREFIX + json.dumps(result, ensure_ascii=False))
+        return 0
+
+    from batch_generator import resolve_age_groups
+
+    with open(os.path.join(REPO_DIR, "curriculum_map.json"), "r", encoding="utf-8") as f:
+        curriculum_map = json.load(f)
+    try:
+        groups = resolve_age_groups(args.groups, curriculum_map) if args.groups else list(curriculum_map)
+    except ValueError as e:
+        parser.error(str(e))
+    config = {
+        "latency_ms": args.latency_ms,
+        "latency_sigma": args.latency_sigma,
+        "ttft_fraction": args.ttft_fraction,
+        "stream_chunks": args.stream_chunks,
+        "error_rate": args.error_rate,
+        "throttle_rate": args.throttle_rate,
+        "response_chars": args.response_chars,
+        "seed": args.seed,
+        "mock_embeddings": args.mock_embeddings,
+        "groups": groups,
+    }
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(unknown)}")
+
+    # Генерации нужен индекс, поэтому build_index выполняется всегда, даже если его не просили замерять.
+    names = ["build_index"]
+    if "distiller" in selected:
+        names.append("distiller")
+    if "generation" in selected:
+        names.extend(f"generation:{group}" for group in groups)
+    if "batch" in selected:
+        names.append("batch")
+
+    previous_path = latest_result_file(args.results_dir)
+    previous = {}
+    if previous_path:
+        with open(previous_path, "r", encoding="utf-8") as f:
+            previous = json.load(f).get("scenarios", {})
+
+    workdir = prepare_workdir()
+    print(f"Рабочая папка бенчмарка: {workdir}")
+    results = {}
+    try:
+        for name in names:
+            print(f"\nСценарий {name}...")
+            results[name] = run_child(name, config, workdir)
+            if name == "build_index" and "error" in results[name]:
+                print(format_scenario(name, results[name]))
+                print("Без индекса генерацию замерить нельзя, бенчмарк остановлен.")
+                break
+            print(format_scenario(name, results[name], previous.get(name)))
+    finally:
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if "build_index" not in selected:
+        results.pop("build_index", None)
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "max_concurrent_cells": os.getenv("MAX_CONCURRENT_CELLS"),
+        "config": config,
+        "scenarios": results,
+    }
+    os.makedirs(args.results_dir, exist_ok=True)
+    output_path = os.path.join(args.results_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{report['commit'] or 'nogit'}.json")
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты сохранены: {output_path}")
+    if previous_path:
+        print(f"Сравнение — с {os.path.basename(previous_path)}.")
+    return 1 if any("error" in result for result in results.values()) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+import hashlib
+import argparse
+import statistics
+from collections import Counter, defaultdict
+from area_registry import load_area_registry
+from retrieval import search_hits, prefetch_plan_context
+from generation_engine import ALL_MONTHS, collect_plan_cells
+from bench_pipeline import BENCH_RESULTS_DIR, git_commit, latest_result_file
+
+# Микро-бенчмарки поиска по базе знаний и контроль качества: скорость encode и поиска FAISS,
+# полная стоимость предвыборки контекста и recall@k на замороженном наборе пар (тема, ожидаемый источник).
+
+EVAL_SET_PATH = "retrieval_eval_set.json"
+SOURCE_DATA_FOLDER = "final_docs/"
+RESULTS_DIR = os.path.join(BENCH_RESULTS_DIR, "retrieval")
+ENCODE_BATCH_SIZES = (1, 8, 32, 128)
+SEARCH_KS = (1, 5, 10, 20, 50)
+SEARCH_BATCH_SIZES = (1, 16, 64, 256)
+RECALL_KS = (1, 5, 10, 20)
+REPEATS = 5
+MAX_RECALL_DROP = 0.02
+
+# Параметры разметки набора: окно чанка как в build_index.py, BM25 по основам слов (первые 5 букв).
+FREEZE_CHUNK_SIZE = 1500
+FREEZE_CHUNK_OVERLAP = 150
+FREEZE_MIN_COVERAGE = 0.75
+FREEZE_MIN_MARGIN = 1.3
+FREEZE_MAX_PER_SOURCE = 16
+FREEZE_MAX_PER_SOURCE_AREA = 2
+WORD = re.compile(r"[a-zа-яёәғқңөұүһі]{3,}")
+
+def lexical_terms(text):
+    """Грубые основы слов: для русского текста первых пяти букв достаточно, чтобы склеить словоформы."""
+    return [word[:5] for word in WORD.findall(text.lower())]
+
+def iter_plan_topics(curriculum_map):
+    for age_group, areas in curriculum_map.items():
+        for area, months in areas.items():
+            for monthly_plan in months:
+                for topic in monthly_plan.get("key_topics", []):
+                    yield age_group, area, topic
+
+def freeze_eval_set(curriculum_map, folder=SOURCE_DATA_FOLDER):
+    """
+    Размечает ожидаемый источник для тем учебного плана без модели эмбеддингов:
+    тема ищется по чанкам исходных текстов через BM25, и пара берется в набор,
+    только если лучший чанк покрывает почти все слова темы и заметно опережает
+    лучший чанк из другого файла. Разметка не зависит от индекса, поэтому
+    по ней можно сравнивать разные типы индекса и нарезку чанков.
+    """
+    chunks = []
+    for filename in sorted(os.listdir(folder)):
+        if not filename.endswith(".txt"):
+            continue
+        with open(os.path.join(folder, filename), "r", encoding="utf-8") as f:
+            text = f.read()
+        step = FREEZE_CHUNK_SIZE - FREEZE_CHUNK_OVERLAP
+        for start in range(0, len(text), step):
+            chunks.append((filename, Counter(lexical_terms(text[start:start + FREEZE_CHUNK_SIZE]))))
+    if not chunks:
+        raise ValueError(f"В папке '{folder}' нет текстовых файлов для разметки.")
+
+    document_frequency = Counter(term for _, terms in chunks for term in terms)
+    average_length = sum(sum(terms.values()) for _, terms in chunks) / len(chunks)
+
+    def bm25(query_terms, terms, k1=1.5, b=0.75):
+        length = sum(terms.values())
+        score = 0.0
+        for term in query_terms:
+            if term in terms:
+                idf = math.log(1 + (len(chunks) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+                score += idf * terms[term] * (k1 + 1) / (terms[term] + k1 * (1 - b + b * length / average_length))
+        return score
+
+    pairs = []
+    seen_topics = set()
+    per_source = Counter()
+    per_source_area = Counter()
+    for age_group, area, topic in iter_plan_topics(curriculum_map):
+        query_terms = set(lexical_terms(topic))
+        if topic in seen_topics or len(query_terms) < 2:
+            continue
+        seen_topics.add(topic)
+        scored = sorted(((bm25(query_terms, terms), source, terms) for source, terms in chunks), key=lambda item: item[0], reverse=True)
+        best_score, best_source, best_terms = scored[0]
+        runner_up = next((score for score, source, _ in scored if source != best_source), 0.0)
+        coverage = sum(term in best_terms for term in query_terms) / len(query_terms)
+        if coverage < FREEZE_MIN_COVERAGE or best_score < FREEZE_MIN_MARGIN * runner_up:
+            continue
+        # Ограничения на файл во всем наборе и на его пары в одной области: иначе набор
+        # заполнил бы самый большой документ корпуса, а его пары — первые области плана.
+        if per_source[best_source] >= FREEZE_MAX_PER_SOURCE or per_source_area[(best_source, area)] >= FREEZE_MAX_PER_SOURCE_AREA:
+            continue
+        per_source[best_source] += 1
+        per_source_area[(best_source, area)] += 1
+        pairs.append({"age_group": age_group, "area": area, "topic": topic, "expected_source": best_source})
+    return pairs
+
+def load_eval_set(path=EVAL_SET_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data["pairs"], data["sha256"]
+
+def save_eval_set(pairs, path=EVAL_SET_PATH):
+    payload = json.dumps(pairs, ensure_ascii=False, sort_keys=True)
+    data = {
+        "description": "Замороженные пары (тема плана, ожидаемый файл-источник) для recall@k. Пересоздается командой python bench_retrieval.py --freeze.",
+        "sha256": hashlib.sha256(payload.encode("utf-8")).hexdigest(),
+        "pairs": pairs,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return data["sha256"]
+
+def timings_ms(func, repeats):
+    """Медиана и минимум времени вызова в миллисекундах; первый вызов — прогрев, он не учитывается."""
+    func()
+    samples = []
+    for _ in range(repeats):
+        started_at = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started_at) * 1000)
+    return {"median_ms": round(statistics.median(samples), 3), "min_ms": round(min(samples), 3)}
+
+def bench_encode(model, queries, repeats):
+    """Задержка encode модели без кэша эмбеддингов для разных размеров пачки запросов."""
+    results = {}
+    for batch_size in ENCODE_BATCH_SIZES:
+        batch = (queries * (batch_size // len(queries) + 1))[:batch_size]
+        timing = timings_ms(lambda: model.encode(batch), repeats)
+        timing["per_query_ms"] = round(timing["median_ms"] / batch_size, 3)
+        results[str(batch_size)] = timing
+        print(f"  encode, пачка {batch_size:>4}: {timing['median_ms']:.2f} мс ({timing['per_query_ms']:.2f} мс на запрос)")
+    return results
+
+def bench_search(faiss_index, query_vectors, repeats):
+    """Задержка faiss_index.search для сетки k и размеров пачки (векторы уже нормированы)."""
+    import numpy as np
+
+    results = {}
+    for batch_size in SEARCH_BATCH_SIZES:
+        repeat_count = batch_size // len(query_vectors) + 1
+        batch = np.ascontiguousarray(np.tile(query_vectors, (repeat_count, 1))[:batch_size])
+        for k in SEARCH_KS:
+            timing = timings_ms(lambda: faiss_index.search(batch, k), repeats)
+            timing["per_query_ms"] = round(timing["median_ms"] / batch_size, 4)
+            results[f"batch={batch_size},k={k}"] = timing
+        row = ", ".join(f"k={k} {results[f'batch={batch_size},k={k}']['median_ms']:.2f}" for k in SEARCH_KS)
+        print(f"  search, пачка {batch_size:>4}, мс: {row}")
+    return results
+
+def bench_prefetch(curriculum_map, areas, embedding_model, raw_model, faiss_index, documents):
+    """
+    Полная стоимость подготовки контекста плана (prefetch_plan_context) для каждой группы:
+    без кэша эмбеддингов (как при первом прогоне) и с прогретым кэшем (как при повторном).
+    """
+    results = {}
+    for age_group, plan_for_age_group in curriculum_map.items():
+        cells = collect_plan_cells(plan_for_age_group, ALL_MONTHS)
+        timing = {"cells": len(cells)}
+        for label, model in (("uncached_seconds", raw_model), ("warm_cache_seconds", embedding_model)):
+            if label == "warm_cache_seconds":
+                prefetch_plan_context(cells, areas, age_group, model, faiss_index, documents)
+            started_at = time.perf_counter()
+            prefetch_plan_context(cells, areas, age_group, model, faiss_index, documents)
+            timing[label] = round(time.perf_counter() - started_at, 3)
+        timing["per_cell_ms"] = round(timing["uncached_seconds"] / max(1, len(cells)) * 1000, 2)
+        results[age_group] = timing
+    for age_group, timing in results.items():
+        print(f"  {age_group}: {timing['cells']} ячеек, без кэша {timing['uncached_seconds']:.2f} с "
+              f"({timing['per_cell_ms']:.1f} мс на ячейку), с кэшем {timing['warm_cache_seconds']:.2f} с")
+    return results
+
+def evaluate_recall(pairs, areas, embedding_model, faiss_index, documents):
+    """
+    recall@k: доля пар, у которых среди первых k найденных чанков есть чанк из ожидаемого файла;
+    MRR — средний обратный ранг первого такого чанка. in_context — доля пар, у которых
+    такой чанк проходит k и порог близости своей области, то есть действительно попадает в промпт.
+    По областям печатается и наименьшая близость такого чанка среди первых k: порог min_score
+    области выше этого значения отрезает нужные фрагменты, поэтому по нему его и подбирают.
+    """
+    pairs = [pair for pair in pairs if pair["area"] in areas]
+    queries = [areas[pair["area"]].build_queries(pair["age_group"], [pair["topic"]])[0] for pair in pairs]
+    results = search_hits(queries, max(RECALL_KS), embedding_model, faiss_index, documents)
+
+    ranks = []
+    in_context = 0
+    per_area = defaultdict(lambda: [0, 0])
+    per_area_in_context = Counter()
+    expected_scores = defaultdict(list)
+    for pair, hits in zip(pairs, results):
+        area_spec = areas[pair["area"]]
+        rank = next((position for position, hit in enumerate(hits, start=1) if hit.chunk.metadata.get("source") == pair["expected_source"]), None)
+        ranks.append(rank)
+        if rank is not None and rank <= area_spec.k:
+            expected_scores[pair["area"]].append(hits[rank - 1].score)
+            if hits[rank - 1].score >= area_spec.min_score:
+                in_context += 1
+                per_area_in_context[pair["area"]] += 1
+        per_area[pair["area"]][0] += rank is not None and rank <= 10
+        per_area[pair["area"]][1] += 1
+
+    total = max(1, len(pairs))
+    return {
+        "pairs": len(pairs),
+        "recall": {str(k): round(sum(rank is not None and rank <= k for rank in ranks) / total, 4) for k in RECALL_KS},
+        "mrr": round(sum(1 / rank for rank in ranks if rank) / total, 4),
+        "in_context": round(in_context / total, 4),
+        "recall_at_10_by_area": {area: round(found / count, 4) for area, (found, count) in per_area.items()},
+        "in_context_by_area": {area: round(per_area_in_context[area] / count, 4) for area, (_, count) in per_area.items()},
+        "min_expected_score_by_area": {area: round(float(min(scores)), 4) for area, scores in expected_scores.items()},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Микро-бенчмарки поиска и recall@k на замороженном наборе тем.")
+    parser.add_argument("--freeze", action="store_true", help=f"заново разметить набор пар по curriculum_map.json и {SOURCE_DATA_FOLDER} и выйти")
+    parser.add_argument("--recall-only", action="store_true", help="только recall@k, без замеров скорости")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--max-recall-drop", type=float, default=MAX_RECALL_DROP, help="допустимое падение recall@10 относительно прошлого замера")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    args = parser.parse_args()
+
+    with open("curriculum_map.json", "r", encoding="utf-8") as f:
+        curriculum_map = json.load(f)
+
+    if args.freeze:
+        pairs = freeze_eval_set(curriculum_map)
+        digest = save_eval_set(pairs)
+        print(f"Набор из {len(pairs)} пар сохранен в {EVAL_SET_PATH} (sha256 {digest[:12]}).")
+        for source, count in Counter(pair["expected_source"] for pair in pairs).most_common():
+            print(f"  {count:>4}  {source}")
+        return 0
+
+    from resources import ResourceManager
+
+    pairs, eval_set_sha256 = load_eval_set()
+    areas = load_area_registry()
+    resources = ResourceManager()
+    embedding_model = resources.get_embedding_model()
+    faiss_index, documents = resources.get_knowledge_base()
+    if faiss_index is None:
+        return 1
+    raw_model = getattr(embedding_model, "model", embedding_model)
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "index": {"ntotal": faiss_index.ntotal, "type": type(faiss_index).__name__},
+        "eval_set_sha256": eval_set_sha256,
+    }
+    if not args.recall_only:
+        import faiss
+        import numpy as np
+
+        queries = [areas[pair["area"]].build_queries(pair["age_group"], [pair["topic"]])[0] for pair in pairs if pair["area"] in areas]
+        print("\nКодирование запросов (без кэша эмбеддингов):")
+        report["encode"] = bench_encode(raw_model, queries, args.repeats)
+        query_vectors = np.ascontiguousarray(raw_model.encode(queries), dtype="float32")
+        faiss.normalize_L2(query_vectors)
+        print(f"\nПоиск FAISS ({report['index']['type']}, {faiss_index.ntotal} векторов):")
+        report["search"] = bench_search(faiss_index, query_vectors, args.repeats)
+        print("\nПредвыборка контекста плана целиком:")
+        report["prefetch"] = bench_prefetch(curriculum_map, areas, embedding_model, raw_model, faiss_index, documents)
+
+    recall = report["recall"] = evaluate_recall(pairs, areas, embedding_model, faiss_index, documents)
+    print(f"\nКачество поиска на {recall['pairs']} парах: "
+          + ", ".join(f"recall@{k} {value:.3f}" for k, value in recall["recall"].items())
+          + f", MRR {recall['mrr']:.3f}, попадает в промпт {recall['in_context']:.3f}")
+    for area, value in sorted(recall["recall_at_10_by_area"].items(), key=lambda item: item[1]):
+        min_score = recall["min_expected_score_by_area"].get(area)
+        print(f"    recall@10 {value:.3f}, в промпте {recall['in_context_by_area'][area]:.3f}, порог {areas[area].min_score:.2f}, "
+              f"мин. близость нужного чанка {'—' if min_score is None else f'{min_score:.3f}'}  {area}")
+
+    exit_code = 0
+    previous_path = latest_result_file(args.results_dir)
+    if previous_path:
+        with open(previous_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        if previous.get("eval_set_sha256") != eval_set_sha256:
+            print(f"\nПрошлый замер ({os.path.basename(previous_path)}) сделан на другом наборе пар, recall не сравнивается.")
+        else:
+            drop = previous["recall"]["recall"]["10"] - recall["recall"]["10"]
+            print(f"\nrecall@10: было {previous['recall']['recall']['10']:.3f} ({previous.get('commit')}), стало {recall['recall']['10']:.3f}.")
+            if drop > args.max_recall_drop:
+                print(f"КАЧЕСТВО ПОИСКА УПАЛО больше чем на {args.max_recall_drop:.2f}.")
+                exit_code = 1
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    output_path = os.path.join(args.results_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{report['commit'] or 'nogit'}.json")
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены: {output_path}")
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+import os
+import re
+import subprocess
+import sys
+
+# Окно приложения должно появляться быстро: импорт модулей GUI укладывается в этот бюджет.
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "0.8"))
+STARTUP_MODULES = ["main", "gui", "main_generator"]
+# Эти пакеты импортируются только там, где действительно нужны (загрузка моделей, сохранение .docx).
+HEAVY_PACKAGES = ["faiss", "torch", "sentence_transformers", "google.generativeai", "docx"]
+REPEATS = 3
+TOP_IMPORTS = 10
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)$")
+
+def measure_import(module):
+    """
+    Импортирует модуль в отдельном процессе с python -X importtime.
+    Возвращает (общее время импорта в секундах, {пакет: накопленное время в секундах}).
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Не удалось импортировать {module}:\n{result.stderr[-2000:]}")
+
+    total_us = 0
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative_us, indent, name = match.groups()
+        cumulative[name] = int(cumulative_us) / 1e6
+        # Строки верхнего уровня (отступ в один пробел) не пересекаются, их сумма — полное время импорта.
+        if len(indent) == 1:
+            total_us += int(cumulative_us)
+    return total_us / 1e6, cumulative
+
+def find_heavy_imports(cumulative):
+    return sorted(
+        name for name in cumulative
+        if any(name == package or name.startswith(package + ".") for package in HEAVY_PACKAGES)
+    )
+
+def main():
+    print(f"Бюджет времени импорта: {STARTUP_BUDGET_SECONDS:.2f} с (STARTUP_BUDGET_SECONDS).")
+    failed = False
+    for module in STARTUP_MODULES:
+        # Лучший из нескольких запусков: первый может упереться в холодный дисковый кэш.
+        runs = [measure_import(module) for _ in range(REPEATS)]
+        total, cumulative = min(runs, key=lambda run: run[0])
+        heavy = find_heavy_imports(cumulative)
+
+        status = "OK" if total <= STARTUP_BUDGET_SECONDS and not heavy else "ПРЕВЫШЕНИЕ"
+        print(f"\n{module}: {total:.3f} с [{status}]")
+        heaviest = sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:TOP_IMPORTS]
+        for name, seconds in heaviest:
+            print(f"    {seconds:.3f} с  {name}")
+        if heavy:
+            print(f"    Тяжелые пакеты импортируются при старте: {', '.join(heavy)}")
+        failed = failed or status != "OK"
+
+    if failed:
+        print("\nСтарт приложения замедлился: тяжелые зависимости должны импортироваться там, где используются.")
+        sys.exit(1)
+    print("\nВремя старта в пределах бюджета.")
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,36 @@
 import os
+import json
 import faiss
-import pickle
+import time
+import hashlib
+import numpy as np
+from collections import defaultdict
 from sentence_transformers import SentenceTransformer
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.docstore.document import Document
 from tqdm import tqdm
+from retrieval import EMBEDDING_MODEL_NAME
+from chunk_store import CHUNK_STORE_DIR, ChunkStore, write_chunk_store
 
 SOURCE_DATA_FOLDER = "final_docs/"
 FAISS_INDEX_PATH = "faiss_index.bin"
-DOCS_PKL_PATH = "docs.pkl"
+FAISS_BASE_INDEX_PATH = "faiss_base.bin"
+INDEX_MANIFEST_PATH = "index_manifest.json"
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+# Векторы нормируются, а индекс ищет по скалярному произведению, то есть по косинусной близости.
+INDEX_METRIC = "ip"
+# Меньше векторов не хватает для обучения IVF/PQ, такой корпус индексируется точным поиском.
+MIN_VECTORS_FOR_ANN = 1000
+
+def text_sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
 def read_all_text_files(folder_path):
 
     all_texts = []
     print(f"Чтение текстовых файлов из папки '{folder_path}'...")
     filenames = [f for f in os.listdir(folder_path) if f.endswith(".txt")]
-    
+
     for filename in tqdm(filenames, desc="Чтение файлов"):
         file_path = os.path.join(folder_path, filename)
         try:
@@ -25,10 +40,132 @@ def read_all_text_files(folder_path):
                 all_texts.append(doc)
         except Exception as e:
             print(f"Не удалось прочитать файл {filename}: {e}")
-            
+
     print(f"Успешно прочитано {len(all_texts)} документов.")
     return all_texts
 
+def get_index_type():
+    """Тип индекса из переменной INDEX_TYPE: flat (по умолчанию), ivf_flat, ivf_pq или hnsw."""
+    index_type = os.getenv("INDEX_TYPE", "flat").strip().lower()
+    if index_type not in INDEX_TYPES:
+        print(f"ПРЕДУПРЕЖДЕНИЕ: неизвестный INDEX_TYPE '{index_type}', используется flat.")
+        return "flat"
+    return index_type
+
+def base_index_path(index_type):
+    """Точный индекс со всеми векторами: для flat он же рабочий, для ANN хранится отдельно."""
+    return FAISS_INDEX_PATH if index_type == "flat" else FAISS_BASE_INDEX_PATH
+
+def make_ann_index(index_type, embeddings):
+    """Создает ANN-индекс нужного типа через faiss.index_factory и обучает его на эмбеддингах чанков."""
+    n, dimension = embeddings.shape
+    if index_type == "hnsw":
+        index = faiss.index_factory(dimension, "HNSW32", faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efSearch = 64
+        return index
+
+    nlist = max(1, min(int(4 * np.sqrt(n)), n // 39))
+    if index_type == "ivf_flat":
+        index = faiss.index_factory(dimension, f"IVF{nlist},Flat", faiss.METRIC_INNER_PRODUCT)
+    else:
+        m = max(d for d in range(1, min(64, dimension) + 1) if dimension % d == 0)
+        # Для 2^nbits центроидов PQ faiss просит не меньше 39 обучающих векторов на центроид.
+        nbits = int(min(8, max(4, np.log2(n / 39))))
+        index = faiss.index_factory(dimension, f"IVF{nlist},PQ{m}x{nbits}", faiss.METRIC_INNER_PRODUCT)
+    index.train(embeddings)
+    faiss.extract_index_ivf(index).nprobe = min(nlist, max(8, nlist // 16))
+    return index
+
+def convert_to_cosine(base_index):
+    """
+    Переводит точный L2-индекс прошлых сборок на косинусную близость: нормирует
+    уже сохраненные векторы и переносит их в IndexFlatIP с теми же ID, без повторного кодирования чанков.
+    """
+    ids = faiss.vector_to_array(base_index.id_map)
+    embeddings = base_index.index.reconstruct_n(0, base_index.ntotal)
+    faiss.normalize_L2(embeddings)
+    index = faiss.IndexIDMap2(faiss.IndexFlatIP(base_index.d))
+    index.add_with_ids(embeddings, ids)
+    return index
+
+def build_serving_index(base_index, index_type):
+    """Строит рабочий ANN-индекс по всем векторам точного индекса, сохраняя ID чанков."""
+    ids = faiss.vector_to_array(base_index.id_map)
+    embeddings = base_index.index.reconstruct_n(0, base_index.ntotal)
+    index = faiss.IndexIDMap2(make_ann_index(index_type, embeddings))
+    index.add_with_ids(embeddings, ids)
+    return index, embeddings
+
+def evaluate_index(index, base_index, embeddings, k=10, sample_size=200):
+    """
+    Сравнивает ANN-индекс с точным: recall@k и среднее время запроса.
+    В качестве запросов берется случайная выборка эмбеддингов самих чанков.
+    """
+    rng = np.random.default_rng(0)
+    queries = embeddings[rng.choice(len(embeddings), size=min(sample_size, len(embeddings)), replace=False)]
+    k = min(k, base_index.ntotal)
+
+    start_time = time.perf_counter()
+    _, exact_ids = base_index.search(queries, k)
+    flat_ms = (time.perf_counter() - start_time) * 1000 / len(queries)
+
+    start_time = time.perf_counter()
+    _, approx_ids = index.search(queries, k)
+    ann_ms = (time.perf_counter() - start_time) * 1000 / len(queries)
+
+    recall = float(np.mean([len(set(a) & set(e)) / k for a, e in zip(approx_ids, exact_ids)]))
+    print(f"Оценка индекса: recall@{k} = {recall:.3f}, время запроса {ann_ms:.3f} мс (точный поиск: {flat_ms:.3f} мс).")
+    return {"k": k, "recall": recall, "ann_ms_per_query": ann_ms, "flat_ms_per_query": flat_ms}
+
+def load_existing_index():
+    """
+    Загружает индекс, чанки и манифест прошлой сборки. Если чего-то нет, индекс
+    старого формата (без ID) или файлы не согласованы, возвращает пустое состояние.
+    """
+    empty_state = (None, {}, {"model": EMBEDDING_MODEL_NAME, "metric": INDEX_METRIC, "index_type": "flat", "next_id": 0, "files": {}})
+    if not all(os.path.exists(p) for p in (CHUNK_STORE_DIR, INDEX_MANIFEST_PATH)):
+        return empty_state
+    try:
+        with open(INDEX_MANIFEST_PATH, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        index = faiss.read_index(base_index_path(manifest.get("index_type", "flat")))
+        # Чанки копируются в память, чтобы затем перезаписать файлы хранилища.
+        documents = dict(ChunkStore(CHUNK_STORE_DIR).items())
+    except Exception as e:
+        print(f"Не удалось загрузить прошлый индекс, он будет пересобран полностью: {e}")
+        return empty_state
+
+    is_consistent = (
+        manifest.get("model") == EMBEDDING_MODEL_NAME
+        and isinstance(index, faiss.IndexIDMap2)
+        and index.ntotal == len(documents) == manifest.get("ntotal")
+    )
+    if not is_consistent:
+        print("Прошлый индекс в старом формате или не согласован с манифестом, он будет пересобран полностью.")
+        return empty_state
+    return index, documents, manifest
+
+def write_index_atomically(index, path):
+    faiss.write_index(index, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+def write_manifest(manifest):
+    with open(INDEX_MANIFEST_PATH + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(INDEX_MANIFEST_PATH + ".tmp", INDEX_MANIFEST_PATH)
+
+def save_atomically(base_index, serving_index, documents, manifest):
+    """Пишет каждый файл во временный и подменяет его целиком; манифест — последним."""
+    if serving_index is base_index:
+        write_index_atomically(base_index, FAISS_INDEX_PATH)
+        if os.path.exists(FAISS_BASE_INDEX_PATH):
+            os.remove(FAISS_BASE_INDEX_PATH)
+    else:
+        write_index_atomically(base_index, FAISS_BASE_INDEX_PATH)
+        write_index_atomically(serving_index, FAISS_INDEX_PATH)
+    write_chunk_store(documents, CHUNK_STORE_DIR)
+    write_manifest(manifest)
+
 def main():
 
     raw_documents = read_all_text_files(SOURCE_DATA_FOLDER)
@@ -36,38 +173,107 @@ def main():
         print("Не найдено текстовых файлов для индексации. Завершение работы.")
         return
 
-    print("\nРазбиваю документы на чанки...")
+    index_type = get_index_type()
+    index, documents, manifest = load_existing_index()
+    current_files = {doc.metadata["source"]: doc for doc in raw_documents}
+
+    metric_changed = index is not None and manifest.get("metric") != INDEX_METRIC
+    if metric_changed:
+        print("Прошлый индекс построен по L2-расстоянию, перевожу его на косинусную близость...")
+        index = convert_to_cosine(index)
+
     text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1500, 
+        chunk_size=1500,
         chunk_overlap=150,
         length_function=len,
     )
-    chunked_documents = text_splitter.split_documents(raw_documents)
-    print(f"Документы разбиты на {len(chunked_documents)} чанков.")
-
-    print("\nСоздаю эмбеддинги для каждого чанка...")
-    model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-    
-    chunk_texts = [doc.page_content for doc in chunked_documents]
-    embeddings = model.encode(chunk_texts, show_progress_bar=True)
-    
-    print(f"Создано {len(embeddings)} эмбеддингов.")
-    print("\nСоздаю и наполняю индекс FAISS...")
-    dimension = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dimension)
-    index.add(embeddings.astype('float32'))
-    
-    print(f"Индекс FAISS создан. В нем {index.ntotal} векторов.")
+
+    print("\nСравниваю файлы с прошлой сборкой индекса...")
+    ids_to_remove = []
+    new_chunks = []
+    new_files = {}
+    for filename, entry in manifest["files"].items():
+        if filename not in current_files:
+            ids_to_remove.extend(chunk_id for _, chunk_id in entry["chunks"])
+
+    for filename, doc in current_files.items():
+        file_hash = text_sha256(doc.page_content)
+        old_entry = manifest["files"].get(filename)
+        if old_entry and old_entry["sha256"] == file_hash:
+            new_files[filename] = old_entry
+            continue
+
+        # Неизмененные чанки измененного файла сохраняют свои ID и эмбеддинги.
+        old_ids_by_hash = defaultdict(list)
+        for chunk_hash, chunk_id in (old_entry["chunks"] if old_entry else []):
+            old_ids_by_hash[chunk_hash].append(chunk_id)
+
+        file_chunks = []
+        for chunk in text_splitter.split_documents([doc]):
+            chunk_hash = text_sha256(chunk.page_content)
+            if old_ids_by_hash[chunk_hash]:
+                file_chunks.append([chunk_hash, old_ids_by_hash[chunk_hash].pop()])
+            else:
+                chunk_id = manifest["next_id"]
+                manifest["next_id"] += 1
+                file_chunks.append([chunk_hash, chunk_id])
+                new_chunks.append((chunk_id, chunk))
+        ids_to_remove.extend(chunk_id for ids in old_ids_by_hash.values() for chunk_id in ids)
+        new_files[filename] = {"sha256": file_hash, "chunks": file_chunks}
+
+    print(f"Новых или измененных чанков: {len(new_chunks)}, удаляемых: {len(ids_to_remove)}.")
+    if index is not None and not new_chunks and not ids_to_remove and not metric_changed and manifest["index_type"] == index_type:
+        print("\nИндекс актуален, пересборка не требуется.")
+        # Файл мог измениться без изменения чанков (например, пробелы на краях): новый хэш
+        # файла сохраняется, иначе файл заново читался бы и резался при каждом запуске.
+        if new_files != manifest["files"]:
+            manifest["files"] = new_files
+            write_manifest(manifest)
+        return
+
+    if ids_to_remove:
+        index.remove_ids(np.array(ids_to_remove, dtype='int64'))
+        for chunk_id in ids_to_remove:
+            documents.pop(chunk_id, None)
+
+    if new_chunks:
+        print("\nСоздаю эмбеддинги для новых чанков...")
+        model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        chunk_texts = [chunk.page_content for _, chunk in new_chunks]
+        embeddings = model.encode(chunk_texts, show_progress_bar=True).astype('float32')
+        faiss.normalize_L2(embeddings)
+        print(f"Создано {len(embeddings)} эмбеддингов.")
+
+        if index is None:
+            print("\nСоздаю индекс FAISS...")
+            index = faiss.IndexIDMap2(faiss.IndexFlatIP(embeddings.shape[1]))
+        index.add_with_ids(embeddings, np.array([chunk_id for chunk_id, _ in new_chunks], dtype='int64'))
+        for chunk_id, chunk in new_chunks:
+            documents[chunk_id] = chunk
+
+    serving_index = index
+    manifest.pop("evaluation", None)
+    if index_type != "flat" and index.ntotal < MIN_VECTORS_FOR_ANN:
+        print(f"В индексе меньше {MIN_VECTORS_FOR_ANN} векторов, вместо {index_type} используется точный индекс flat.")
+        index_type = "flat"
+    if index_type != "flat":
+        print(f"\nСтрою и обучаю индекс {index_type}...")
+        serving_index, embeddings = build_serving_index(index, index_type)
+        manifest["evaluation"] = evaluate_index(serving_index, index, embeddings)
+
+    manifest["files"] = new_files
+    manifest["ntotal"] = index.ntotal
+    manifest["metric"] = INDEX_METRIC
+    manifest["index_type"] = index_type
+    print(f"Индекс FAISS ({index_type}) обновлен. В нем {serving_index.ntotal} векторов.")
 
     print("\nСохраняю результаты...")
     try:
-        faiss.write_index(index, FAISS_INDEX_PATH)
+        save_atomically(index, serving_index, documents, manifest)
         print(f"- Индекс успешно сохранен в '{FAISS_INDEX_PATH}'")
-        
-        with open(DOCS_PKL_PATH, "wb") as f:
-            pickle.dump(chunked_documents, f)
-        print(f"- Чанки успешно сохранены в '{DOCS_PKL_PATH}'")
-            
+        print(f"- Чанки успешно сохранены в '{CHUNK_STORE_DIR}'")
+        print(f"- Манифест сборки сохранен в '{INDEX_MANIFEST_PATH}'")
+
         print("\nПРОЦЕСС ИНДЕКСАЦИИ УСПЕШНО ЗАВЕРШЕН!")
         print("Теперь ваша база знаний готова к работе с main_generator.py")
 
@@ -76,4 +282,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,108 @@
+import os
+import json
+import numpy as np
+
+CHUNK_STORE_DIR = "chunk_store/"
+TEXTS_FILE = "texts.bin"
+OFFSETS_FILE = "offsets.npy"
+IDS_FILE = "ids.npy"
+METADATA_INDEX_FILE = "metadata_index.npy"
+META_FILE = "meta.json"
+
+class StoredChunk:
+    """Чанк из хранилища; как и Document из LangChain, содержит page_content и metadata."""
+    __slots__ = ("page_content", "metadata")
+
+    def __init__(self, page_content, metadata):
+        self.page_content = page_content
+        self.metadata = metadata
+
+class ChunkStore:
+    """
+    Хранилище чанков базы знаний: тексты лежат одним UTF-8 блобом, к нему прилагаются
+    массив смещений, отсортированные FAISS ID и таблица метаданных. Все массивы
+    отображаются в память, поэтому загрузка не зависит от размера корпуса,
+    а текст чанка декодируется только при обращении по ID.
+    """
+
+    def __init__(self, directory=CHUNK_STORE_DIR):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.metadata_table = meta["metadata_table"]
+        self.ids = np.load(os.path.join(directory, IDS_FILE), mmap_mode='r')
+        self.offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode='r')
+        self.metadata_index = np.load(os.path.join(directory, METADATA_INDEX_FILE), mmap_mode='r')
+        if not (len(self.ids) == len(self.metadata_index) == len(self.offsets) - 1 == meta["count"]):
+            raise ValueError(f"Файлы хранилища чанков в '{directory}' не согласованы между собой.")
+
+        texts_path = os.path.join(directory, TEXTS_FILE)
+        if os.path.getsize(texts_path) > 0:
+            self._texts = np.memmap(texts_path, dtype=np.uint8, mode='r')
+        else:
+            self._texts = np.empty(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _row(self, chunk_id):
+        row = int(np.searchsorted(self.ids, chunk_id))
+        if row >= len(self.ids) or self.ids[row] != chunk_id:
+            raise KeyError(chunk_id)
+        return row
+
+    def __contains__(self, chunk_id):
+        try:
+            self._row(chunk_id)
+            return True
+        except KeyError:
+            return False
+
+    def _chunk_at(self, row):
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        text = self._texts[start:end].tobytes().decode("utf-8")
+        return StoredChunk(text, dict(self.metadata_table[int(self.metadata_index[row])]))
+
+    def __getitem__(self, chunk_id):
+        return self._chunk_at(self._row(chunk_id))
+
+    def items(self):
+        for row, chunk_id in enumerate(self.ids):
+            yield int(chunk_id), self._chunk_at(row)
+
+def write_chunk_store(documents, directory=CHUNK_STORE_DIR):
+    """
+    Записывает чанки ({FAISS ID: чанк с page_content и metadata}) в хранилище.
+    Каждый файл пишется во временный и подменяется целиком; meta.json — последним.
+    """
+    os.makedirs(directory, exist_ok=True)
+    ids = np.array(sorted(documents), dtype='int64')
+    offsets = np.zeros(len(ids) + 1, dtype='int64')
+    metadata_table = []
+    metadata_rows = {}
+    metadata_index = np.zeros(len(ids), dtype='int32')
+
+    tmp_paths = {name: os.path.join(directory, name + ".tmp") for name in (TEXTS_FILE, OFFSETS_FILE, IDS_FILE, METADATA_INDEX_FILE, META_FILE)}
+    with open(tmp_paths[TEXTS_FILE], "wb") as f:
+        position = 0
+        for row, chunk_id in enumerate(ids):
+            chunk = documents[int(chunk_id)]
+            encoded = chunk.page_content.encode("utf-8")
+            f.write(encoded)
+            position += len(encoded)
+            offsets[row + 1] = position
+
+            metadata_key = json.dumps(chunk.metadata, ensure_ascii=False, sort_keys=True)
+            if metadata_key not in metadata_rows:
+                metadata_rows[metadata_key] = len(metadata_table)
+                metadata_table.append(chunk.metadata)
+            metadata_index[row] = metadata_rows[metadata_key]
+
+    for name, array in ((OFFSETS_FILE, offsets), (IDS_FILE, ids), (METADATA_INDEX_FILE, metadata_index)):
+        with open(tmp_paths[name], "wb") as f:
+            np.save(f, array)
+    with open(tmp_paths[META_FILE], "w", encoding="utf-8") as f:
+        json.dump({"count": len(ids), "metadata_table": metadata_table}, f, ensure_ascii=False)
+
+    for name in (TEXTS_FILE, OFFSETS_FILE, IDS_FILE, METADATA_INDEX_FILE, META_FILE):
+        os.replace(tmp_paths[name], os.path.join(directory, name))
@@ -0,0 +1,134 @@
+import math
+
+DEFAULT_CONTEXT_TOKEN_BUDGET = 3000
+# Приблизительная оценка для русского текста: токенизатор Gemini тратит около токена на 3 символа кириллицы.
+CHARS_PER_TOKEN = 3
+# Соседние чанки build_index.py перекрываются на chunk_overlap=150 символов;
+# более короткие совпадения краев считаются случайными.
+MIN_MERGE_OVERLAP = 30
+MAX_MERGE_OVERLAP = 400
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+def get_context_token_budget():
+    """Лимит токенов контекста на одну ячейку (CONTEXT_TOKEN_BUDGET в .env, 0 — без лимита)."""
+    # llm_client сам импортирует этот модуль (estimate_tokens), поэтому импорт здесь, а не в начале файла.
+    from llm_client import get_env_limit
+
+    return get_env_limit("CONTEXT_TOKEN_BUDGET", DEFAULT_CONTEXT_TOKEN_BUDGET)
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def text_overlap(left, right):
+    """Длина самого длинного конца left, совпадающего с началом right (0, если перекрытия нет)."""
+    for size in range(min(len(left), len(right), MAX_MERGE_OVERLAP), MIN_MERGE_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+class ContextPiece:
+    """Фрагмент контекста: один чанк или несколько склеенных соседних чанков одного источника."""
+
+    def __init__(self, chunk_id, chunk, topic_index, priority):
+        self.chunk_ids = [chunk_id]
+        self.text = chunk.page_content
+        self.source = chunk.metadata.get("source")
+        self.topic_indices = [topic_index]
+        self.priority = priority
+
+    def absorb(self, other, text):
+        self.chunk_ids.extend(other.chunk_ids)
+        self.text = text
+        self.topic_indices.extend(i for i in other.topic_indices if i not in self.topic_indices)
+        self.priority = min(self.priority, other.priority)
+
+    def try_merge(self, other):
+        """Склеивает other с этим фрагментом, если они из одного источника и текст перекрывается."""
+        if self.source is None or self.source != other.source:
+            return False
+        if other.text in self.text:
+            self.absorb(other, self.text)
+        elif self.text in other.text:
+            self.absorb(other, other.text)
+        elif overlap := text_overlap(self.text, other.text):
+            self.absorb(other, self.text + other.text[overlap:])
+        elif overlap := text_overlap(other.text, self.text):
+            self.absorb(other, other.text + self.text[overlap:])
+        else:
+            return False
+        return True
+
+    def render(self, topics):
+        names = [topics[i] for i in sorted(self.topic_indices)]
+        if len(names) == 1:
+            return f"[Пример методики по теме '{names[0]}']: {self.text}"
+        quoted_names = ", ".join(f"'{name}'" for name in names)
+        return f"[Пример методики по темам {quoted_names}]: {self.text}"
+
+def assemble_context(key_topics, reinforcement_topics, hits_per_topic, token_budget=None, stats=None):
+    """
+    Собирает контекст ячейки из найденных фрагментов: убирает чанки, найденные
+    по нескольким темам (по FAISS ID), склеивает перекрывающиеся соседние чанки
+    и укладывается в лимит токенов. При нехватке места первыми берутся лучшие
+    фрагменты ключевых тем, затем тем для закрепления.
+    hits_per_topic идет в порядке key_topics + reinforcement_topics и содержит
+    для каждой темы список (FAISS ID, чанк, близость) от лучшего к худшему.
+    В stats (если передан) накапливаются счетчики found, duplicates, merged, over_budget,
+    а также used_chunks (сколько чанков вошло в контекст) и context_tokens (оценка его размера).
+    """
+    if token_budget is None:
+        token_budget = get_context_token_budget()
+    topics = list(key_topics) + list(reinforcement_topics)
+    stats = stats if stats is not None else {}
+    for name in ("found", "duplicates", "merged", "over_budget", "used_chunks", "context_tokens"):
+        stats.setdefault(name, 0)
+
+    pieces_by_id = {}
+    pieces = []
+    for topic_index, hits in enumerate(hits_per_topic):
+        tier = 0 if topic_index < len(key_topics) else 1
+        for rank, (chunk_id, chunk, score) in enumerate(hits):
+            stats["found"] += 1
+            priority = (tier, rank, -score)
+            if chunk_id in pieces_by_id:
+                stats["duplicates"] += 1
+                piece = pieces_by_id[chunk_id]
+                if topic_index not in piece.topic_indices:
+                    piece.topic_indices.append(topic_index)
+                piece.priority = min(piece.priority, priority)
+                continue
+            piece = ContextPiece(chunk_id, chunk, topic_index, priority)
+            pieces_by_id[chunk_id] = piece
+            pieces.append(piece)
+
+    merged_pieces = []
+    for piece in pieces:
+        position = len(merged_pieces)
+        # Склеенный фрагмент может перекрыться и с другими, поэтому пробуем снова, пока склеивается.
+        # Он встает на место самого раннего из склеенных, чтобы не нарушить порядок тем и рангов.
+        while (index := next((i for i, p in enumerate(merged_pieces) if p.try_merge(piece)), None)) is not None:
+            stats["merged"] += 1
+            piece = merged_pieces.pop(index)
+            position = min(position, index)
+        merged_pieces.insert(position, piece)
+
+    selected = []
+    used_tokens = 0
+    separator_tokens = estimate_tokens(CONTEXT_SEPARATOR)
+    for piece in sorted(merged_pieces, key=lambda p: p.priority):
+        # Разделитель между фрагментами тоже занимает место в лимите.
+        tokens = estimate_tokens(piece.render(topics)) + (separator_tokens if selected else 0)
+        # Лучший фрагмент попадает в контекст всегда, даже если один превышает лимит.
+        if token_budget and selected and used_tokens + tokens > token_budget:
+            stats["over_budget"] += 1
+            continue
+        selected.append(piece)
+        used_tokens += tokens
+
+    # В промпт фрагменты идут в порядке тем, как и раньше, а не в порядке приоритета.
+    order = {id(piece): i for i, piece in enumerate(merged_pieces)}
+    selected.sort(key=lambda p: (min(p.topic_indices), order[id(p)]))
+    context = CONTEXT_SEPARATOR.join(piece.render(topics) for piece in selected)
+    stats["used_chunks"] += sum(len(piece.chunk_ids) for piece in selected)
+    stats["context_tokens"] += estimate_tokens(context)
+    return context
@@ -1,21 +1,31 @@
 import fitz
 import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import google.generativeai as genai
 from dotenv import load_dotenv
 from tqdm import tqdm
+from llm_client import RateLimitedGenerativeModel, get_env_limit
 
 SOURCE_PDF_DIR = "pdfs/"
 DISTILLED_TXT_DIR = "final_docs/"
 CHUNK_SIZE = 7000
+DEFAULT_MAX_CONCURRENT_CHUNKS = 8
+DISTILL_MANIFEST_PATH = "distill_manifest.json"
 
-def setup_distiller():
+def get_max_concurrent_chunks():
+    """Число одновременных запросов к Gemini при разборе PDF (MAX_CONCURRENT_CHUNKS в .env)."""
+    return max(1, get_env_limit("MAX_CONCURRENT_CHUNKS", DEFAULT_MAX_CONCURRENT_CHUNKS))
+
+def setup_distiller(max_workers=DEFAULT_MAX_CONCURRENT_CHUNKS):
     load_dotenv()
     gemini_api_key = os.getenv("GEMINI_API_KEY")
     if not gemini_api_key:
         print("Ошибка: API ключ GEMINI не найден.")
         return None
     genai.configure(api_key=gemini_api_key)
-    return genai.GenerativeModel("gemini-1.5-flash") 
+    return RateLimitedGenerativeModel(genai.GenerativeModel("gemini-1.5-flash"), max_concurrency=max_workers)
 
 def extract_text_from_pdf(pdf_path):
     try:
@@ -51,36 +61,143 @@ def distill_chunk(model, chunk):
         response = model.generate_content(prompt)
         return response.text
     except Exception as e:
+        # Временные ошибки и 429 уже повторены RateLimitedGenerativeModel; пустой конспект
+        # оставляет файл незавершенным, и кусок будет отправлен снова при следующем запуске.
         print(f"Ошибка при обращении к Gemini: {e}")
         return ""
 
+def split_into_chunks(full_text):
+    return [full_text[i:i+CHUNK_SIZE] for i in range(0, len(full_text), CHUNK_SIZE)]
+
+def write_distilled_file(filename, distilled_content):
+    output_txt_path = os.path.join(DISTILLED_TXT_DIR, f"{os.path.splitext(filename)[0]}.txt")
+    with open(output_txt_path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(distilled_content))
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_key(model, chunk):
+    """Хэш куска вместе с именем модели: смена модели заново дистиллирует все куски."""
+    model_name = getattr(model, "model_name", "")
+    return hashlib.sha256(f"{model_name}\0{chunk}".encode("utf-8")).hexdigest()
+
+def load_manifest(path=DISTILL_MANIFEST_PATH):
+    """Манифест: хэши исходных PDF и готовые конспекты кусков по их хэшам."""
+    if not os.path.exists(path):
+        return {"files": {}, "chunks": {}}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"ПРЕДУПРЕЖДЕНИЕ: не удалось прочитать {path}, дистилляция начнется с нуля. {e}")
+        return {"files": {}, "chunks": {}}
+
+def save_manifest(manifest, path=DISTILL_MANIFEST_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def prune_manifest(manifest, pdf_files):
+    """Убирает из манифеста удаленные PDF и куски, на которые больше никто не ссылается."""
+    manifest["files"] = {name: entry for name, entry in manifest["files"].items() if name in pdf_files}
+    used_keys = {key for entry in manifest["files"].values() for key in entry["chunks"]}
+    manifest["chunks"] = {key: text for key, text in manifest["chunks"].items() if key in used_keys}
+
+def distill_pdfs(model, pdf_files, max_workers, manifest):
+    """
+    Конвейер дистилляции: текст из PDF извлекается в пуле процессов, куски сразу
+    уходят в пул из max_workers параллельных запросов к Gemini, а файл записывается,
+    как только готовы все его куски (в исходном порядке).
+    Неизмененные PDF пропускаются, а уже дистиллированные куски берутся из манифеста.
+    """
+    pdf_hashes = {}
+    changed_files = []
+    for filename in pdf_files:
+        pdf_hash = file_sha256(os.path.join(SOURCE_PDF_DIR, filename))
+        pdf_hashes[filename] = pdf_hash
+        output_txt_path = os.path.join(DISTILLED_TXT_DIR, f"{os.path.splitext(filename)[0]}.txt")
+        entry = manifest["files"].get(filename)
+        if entry and entry["complete"] and entry["pdf_sha256"] == pdf_hash and os.path.exists(output_txt_path):
+            continue
+        changed_files.append(filename)
+    print(f"Без изменений: {len(pdf_files) - len(changed_files)} PDF, к обработке: {len(changed_files)}.")
+
+    distilled_by_file = {}
+    keys_by_file = {}
+    remaining_by_file = {}
+    chunk_futures = {}
+    reused_chunks = 0
+
+    def finish_file(filename):
+        distilled_content = distilled_by_file.pop(filename)
+        write_distilled_file(filename, distilled_content)
+        # Файл с неудавшимися кусками не считается готовым, чтобы при следующем запуске их повторить.
+        manifest["files"][filename] = {
+            "pdf_sha256": pdf_hashes[filename],
+            "chunks": keys_by_file[filename],
+            "complete": all(distilled_content),
+        }
+        save_manifest(manifest)
+        tqdm.write(f"Готов файл: {filename}")
+
+    with ProcessPoolExecutor() as pdf_pool, ThreadPoolExecutor(max_workers=max_workers) as llm_pool:
+        text_futures = {
+            pdf_pool.submit(extract_text_from_pdf, os.path.join(SOURCE_PDF_DIR, filename)): filename
+            for filename in changed_files
+        }
+        for text_future in tqdm(as_completed(text_futures), total=len(text_futures), desc="Извлечение текста"):
+            filename = text_futures[text_future]
+            full_text = text_future.result()
+            if not full_text:
+                continue
+
+            chunks = split_into_chunks(full_text)
+            keys = [chunk_key(model, chunk) for chunk in chunks]
+            distilled_by_file[filename] = [manifest["chunks"].get(key) for key in keys]
+            keys_by_file[filename] = keys
+            remaining_by_file[filename] = 0
+            for i, chunk in enumerate(chunks):
+                if distilled_by_file[filename][i] is not None:
+                    reused_chunks += 1
+                    continue
+                remaining_by_file[filename] += 1
+                chunk_futures[llm_pool.submit(distill_chunk, model, chunk)] = (filename, i)
+            if remaining_by_file[filename] == 0:
+                finish_file(filename)
+
+        for chunk_future in tqdm(as_completed(chunk_futures), total=len(chunk_futures), desc="Дистилляция кусков"):
+            filename, i = chunk_futures[chunk_future]
+            distilled_chunk = chunk_future.result()
+            distilled_by_file[filename][i] = distilled_chunk
+            if distilled_chunk:
+                manifest["chunks"][keys_by_file[filename][i]] = distilled_chunk
+            remaining_by_file[filename] -= 1
+            if remaining_by_file[filename] == 0:
+                finish_file(filename)
+
+    print(f"Куски: взято из манифеста {reused_chunks}, отправлено в Gemini {len(chunk_futures)}.")
+
 if __name__ == "__main__":
-    generative_model = setup_distiller()
+    load_dotenv()
+    max_workers = get_max_concurrent_chunks()
+    generative_model = setup_distiller(max_workers)
     if generative_model:
         if not os.path.exists(DISTILLED_TXT_DIR):
             os.makedirs(DISTILLED_TXT_DIR)
 
         pdf_files = [f for f in os.listdir(SOURCE_PDF_DIR) if f.endswith(".pdf")]
-        
-        print(f"Начинаю дистилляцию {len(pdf_files)} PDF документов...")
 
-        for filename in tqdm(pdf_files, desc="Обработка PDF"):
-            pdf_path = os.path.join(SOURCE_PDF_DIR, filename)
-            
-            full_text = extract_text_from_pdf(pdf_path)
-            if not full_text:
-                continue
+        print(f"Начинаю дистилляцию {len(pdf_files)} PDF документов ({max_workers} параллельных запросов)...")
 
-            chunks = [full_text[i:i+CHUNK_SIZE] for i in range(0, len(full_text), CHUNK_SIZE)]
-            
-            distilled_content = []
-            
-            for chunk in tqdm(chunks, desc=f"Дистилляция '{filename}'", leave=False):
-                distilled_chunk = distill_chunk(generative_model, chunk)
-                distilled_content.append(distilled_chunk)
-            
-            output_txt_path = os.path.join(DISTILLED_TXT_DIR, f"{os.path.splitext(filename)[0]}.txt")
-            with open(output_txt_path, "w", encoding="utf-8") as f:
-                f.write("\n\n".join(distilled_content))
+        manifest = load_manifest()
+        distill_pdfs(generative_model, pdf_files, max_workers, manifest)
+        prune_manifest(manifest, pdf_files)
+        save_manifest(manifest)
 
         print(f"\nГОТОВО! Все документы дистиллированы и сохранены в папку: '{DISTILLED_TXT_DIR}'")
\ No newline at end of file
@@ -0,0 +1,143 @@
+import io
+import os
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+DOCUMENT_PART = "word/document.xml"
+TABLE_HEADERS = ('Месяц', 'Образовательная область', 'Задачи организованной деятельности')
+COLUMN_WIDTHS_CM = (2.5, 3.5, 10.0)
+# Управляющие символы запрещены в XML: python-docx на них падает, а в потоковой записи они испортили бы файл.
+XML_ILLEGAL_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+def create_document_header(doc, group_name, year):
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+    doc.add_paragraph('Согласовано').alignment = WD_ALIGN_PARAGRAPH.LEFT
+    doc.add_paragraph(f'Перспективный план организованной деятельности на {year} учебный год', style='Title').alignment = WD_ALIGN_PARAGRAPH.CENTER
+    doc.add_paragraph(f'Группа: {group_name}', style='Subtitle').alignment = WD_ALIGN_PARAGRAPH.CENTER
+    doc.add_page_break()
+
+def setup_table(doc):
+    from docx.shared import Cm
+
+    table = doc.add_table(rows=1, cols=3)
+    table.style = 'Table Grid'
+    table.autofit = False
+    table.layout_algorithm = 1
+
+    hdr_cells = table.rows[0].cells
+    for cell, title in zip(hdr_cells, TABLE_HEADERS):
+        cell.text = title
+        cell.paragraphs[0].runs[0].font.bold = True
+
+    widths = [Cm(width) for width in COLUMN_WIDTHS_CM]
+    for i, width in enumerate(widths):
+        table.columns[i].width = width
+        for cell in table.columns[i].cells:
+            cell.width = width
+
+    return table
+
+def paragraph_xml(text, bold=False):
+    """Абзац WordprocessingML с тем же разбором текста, что у _Cell.text: \\n — разрыв строки, \\t — табуляция."""
+    parts = []
+    for line_number, line in enumerate(XML_ILLEGAL_CHARS.sub("", text).replace("\r\n", "\n").replace("\r", "\n").split("\n")):
+        if line_number:
+            parts.append("<w:br/>")
+        for segment_number, segment in enumerate(line.split("\t")):
+            if segment_number:
+                parts.append("<w:tab/>")
+            if segment:
+                parts.append(f'<w:t xml:space="preserve">{escape(segment)}</w:t>')
+    if not parts:
+        return "<w:p/>"
+    run_properties = "<w:rPr><w:b/></w:rPr>" if bold else ""
+    return f"<w:p><w:r>{run_properties}{''.join(parts)}</w:r></w:p>"
+
+class StreamingDocxWriter:
+    """
+    Пишет документ плана сразу в .docx-архив: каждая строка таблицы сериализуется
+    в XML при добавлении и уходит в сжатый поток document.xml, так что в памяти
+    не держатся ни дерево документа, ни уже записанные строки, а время на строку
+    не зависит от размера таблицы. Заголовок, стили и шапку таблицы строит
+    python-docx, поэтому документ выглядит так же, как собранный целиком через python-docx.
+    Файл пишется во временный path + ".part" и заменяет path только после close();
+    abort() удаляет недописанный файл.
+    """
+
+    def __init__(self, path, group_name, year):
+        from docx import Document
+
+        document = Document()
+        create_document_header(document, group_name, year)
+        table = setup_table(document)
+        self._column_widths = [grid_col.w.twips for grid_col in table._tbl.tblGrid.gridCol_lst]
+        template = io.BytesIO()
+        document.save(template)
+
+        self.path = path
+        self.rows = 0
+        self._temp_path = path + ".part"
+        self._zip = zipfile.ZipFile(self._temp_path, "w", zipfile.ZIP_DEFLATED)
+        try:
+            with zipfile.ZipFile(template) as source:
+                for item in source.infolist():
+                    if item.filename == DOCUMENT_PART:
+                        document_xml = source.read(item).decode("utf-8")
+                    else:
+                        self._zip.writestr(item, source.read(item))
+            # Таблица плана — последний элемент тела документа: строки дописываются перед ее закрывающим тегом.
+            table_end = document_xml.rindex("</w:tbl>")
+            self._suffix = document_xml[table_end:]
+            self._stream = self._zip.open(DOCUMENT_PART, "w")
+            self._stream.write(document_xml[:table_end].encode("utf-8"))
+        except BaseException:
+            self._discard()
+            raise
+
+    def _cell_xml(self, column, text, merge=None, span=1, bold=False):
+        width = sum(self._column_widths[column:column + span])
+        properties = f'<w:tcW w:w="{width}" w:type="dxa"/>'
+        if span > 1:
+            properties += f'<w:gridSpan w:val="{span}"/>'
+        if merge == "restart":
+            properties += '<w:vMerge w:val="restart"/>'
+        elif merge == "continue":
+            properties += "<w:vMerge/>"
+        return f"<w:tc><w:tcPr>{properties}</w:tcPr>{paragraph_xml(text, bold)}</w:tc>"
+
+    def _write_row(self, cells_xml):
+        self._stream.write(f"<w:tr>{cells_xml}</w:tr>".encode("utf-8"))
+        self.rows += 1
+
+    def add_row(self, month, area, content, is_first_entry_for_month=False):
+        # Первая строка месяца всегда открывает объединение: Word показывает restart без продолжения как обычную ячейку.
+        month_xml = self._cell_xml(0, month, "restart") if is_first_entry_for_month else self._cell_xml(0, "", "continue")
+        self._write_row(month_xml + self._cell_xml(1, area) + self._cell_xml(2, content))
+
+    def add_section_row(self, title):
+        """Строка на всю ширину таблицы, например название группы в общем плане нескольких групп."""
+        self._write_row(self._cell_xml(0, title, span=len(self._column_widths), bold=True))
+
+    def close(self):
+        self._stream.write(self._suffix.encode("utf-8"))
+        self._stream.close()
+        self._zip.close()
+        os.replace(self._temp_path, self.path)
+
+    def _discard(self):
+        try:
+            self._zip.close()
+        except Exception:
+            pass
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+    def abort(self):
+        """Удаляет недописанный файл; поток document.xml закрывается, чтобы zipfile отпустил архив."""
+        try:
+            self._stream.close()
+        except Exception:
+            pass
+        self._discard()
@@ -0,0 +1,162 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+
+EMBEDDING_CACHE_DIR = "embedding_cache/"
+DEFAULT_MAX_ENTRIES = 50000
+# Параметры SentenceTransformer.encode, которые не меняют векторы и поэтому не входят в ключ кэша.
+OUTPUT_NEUTRAL_KWARGS = {"batch_size", "show_progress_bar", "device"}
+# Параметры, с которыми результат — не строка float32 фиксированной длины: такие вызовы идут мимо кэша.
+UNCACHEABLE_KWARGS = {"output_value", "convert_to_tensor", "convert_to_numpy", "truncate_dim"}
+
+class EmbeddingCache:
+    """
+    Дисковый кэш эмбеддингов запросов: векторы лежат в memory-mapped файле float32,
+    а индекс (хэш запроса -> номер строки) — в JSON рядом с ним.
+    При переполнении вытесняются давно не использованные запросы.
+    """
+
+    def __init__(self, model_name, cache_dir=EMBEDDING_CACHE_DIR, max_entries=DEFAULT_MAX_ENTRIES):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        safe_model_name = model_name.replace('/', '_').replace('\\', '_')
+        self.directory = os.path.join(cache_dir, safe_model_name)
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.index_path = os.path.join(self.directory, "index.json")
+        self._lock = threading.Lock()
+        self._vectors = None
+        # Счетчики за время жизни объекта: по ним замеры прогона считают попадания в кэш.
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        self.dim = None
+        self.clock = 0
+        self.entries = {}
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("model") != self.model_name:
+                return
+            self.dim = meta["dim"]
+            self.clock = meta["clock"]
+            self.entries = {key: tuple(value) for key, value in meta["entries"].items()}
+            capacity = os.path.getsize(self.vectors_path) // (self.dim * 4)
+            self._vectors = np.memmap(self.vectors_path, dtype='float32', mode='r+', shape=(capacity, self.dim))
+        except Exception as e:
+            print(f"ПРЕДУПРЕЖДЕНИЕ: кэш эмбеддингов поврежден и будет создан заново. {e}")
+            self.dim = None
+            self.clock = 0
+            self.entries = {}
+            self._vectors = None
+
+    def _key(self, query, options=""):
+        if options:
+            query = f"{query}\0{options}"
+        return hashlib.sha1(f"{self.model_name}\0{query}".encode("utf-8")).hexdigest()
+
+    def _ensure_capacity(self, n_slots):
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if capacity >= n_slots:
+            return
+        new_capacity = min(self.max_entries, max(n_slots, capacity * 2, 1024))
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self._vectors = np.memmap(self.vectors_path, dtype='float32', mode='r+', shape=(new_capacity, self.dim))
+
+    def _allocate_slots(self, n):
+        """Выделяет n строк под новые записи, при необходимости вытесняя самые старые."""
+        used = len(self.entries)
+        free_count = min(n, self.max_entries - used)
+        slots = list(range(used, used + free_count))
+        if free_count < n:
+            evicted = sorted(self.entries.items(), key=lambda item: item[1][1])[:n - free_count]
+            for key, (slot, _) in evicted:
+                del self.entries[key]
+                slots.append(slot)
+        return slots
+
+    def _save(self):
+        self._vectors.flush()
+        meta = {
+            "model": self.model_name,
+            "dim": self.dim,
+            "clock": self.clock,
+            "entries": self.entries,
+        }
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.index_path)
+
+    def encode(self, embedding_model, queries, **kwargs):
+        """
+        Возвращает эмбеддинги запросов, вычисляя моделью только те, которых нет в кэше.
+        kwargs передаются в embedding_model.encode; те из них, что меняют векторы
+        (например, normalize_embeddings или prompt), входят в ключ кэша.
+        """
+        queries = list(queries)
+        if not queries:
+            return np.empty((0, self.dim or 0), dtype='float32')
+        options = {name: value for name, value in kwargs.items() if name not in OUTPUT_NEUTRAL_KWARGS}
+        options = json.dumps(options, sort_keys=True, default=repr) if options else ""
+        keys = [self._key(query, options) for query in queries]
+
+        with self._lock:
+            self.clock += 1
+            vectors = {}
+            for key in set(keys):
+                if key in self.entries:
+                    slot, _ = self.entries[key]
+                    vectors[key] = np.array(self._vectors[slot])
+                    self.entries[key] = (slot, self.clock)
+
+            missing = list(dict.fromkeys((key, query) for key, query in zip(keys, queries) if key not in vectors))
+            if missing:
+                new_vectors = np.asarray(embedding_model.encode([query for _, query in missing], **kwargs), dtype='float32')
+                if self.dim is None:
+                    self.dim = new_vectors.shape[1]
+                for (key, _), vector in zip(missing, new_vectors):
+                    vectors[key] = vector
+
+                # Если пакет больше всего кэша, сохраняется только его хвост.
+                to_store = list(zip(missing, new_vectors))[-self.max_entries:]
+                slots = self._allocate_slots(len(to_store))
+                self._ensure_capacity(max(slots) + 1)
+                for ((key, _), vector), slot in zip(to_store, slots):
+                    self._vectors[slot] = vector
+                    self.entries[key] = (slot, self.clock)
+                # Индекс переписывается только при новых записях или вытеснении; отметки времени попаданий сохранятся вместе со следующей записью.
+                self._save()
+            self.hits += len(vectors) - len(missing)
+            self.misses += len(missing)
+
+        print(f"Эмбеддинги запросов: {len(vectors) - len(missing)} из кэша, {len(missing)} вычислено моделью.")
+        return np.stack([vectors[key] for key in keys])
+
+class CachedEmbeddingModel:
+    """Обертка над SentenceTransformer, которая берет эмбеддинги запросов из EmbeddingCache."""
+
+    def __init__(self, model, model_name, cache=None):
+        self.model = model
+        self.model_name = model_name
+        self.cache = cache or EmbeddingCache(model_name)
+
+    def encode(self, queries, **kwargs):
+        if UNCACHEABLE_KWARGS & kwargs.keys():
+            return self.model.encode(queries, **kwargs)
+        if isinstance(queries, str):
+            return self.cache.encode(self.model, [queries], **kwargs)[0]
+        return self.cache.encode(self.model, queries, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
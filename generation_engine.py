@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from llm_client import get_env_limit
+
+ALL_MONTHS = ["Сентябрь", "Октябрь", "Ноябрь", "Декабрь", "Январь", "Февраль", "Март", "Апрель", "Май"]
+DEFAULT_MAX_CONCURRENT_CELLS = 8
+
+def get_max_concurrent_cells():
+    """Возвращает допустимое число одновременных запросов к LLM (MAX_CONCURRENT_CELLS в .env)."""
+    return max(1, get_env_limit("MAX_CONCURRENT_CELLS", DEFAULT_MAX_CONCURRENT_CELLS))
+
+def clean_text(text):
+    """Убирает из ответа модели жирный шрифт Markdown и пустые строки."""
+    text = text.replace('**', '')
+    lines = text.split('\n')
+    non_empty_lines = [line for line in lines if line.strip() != '']
+    final_text = '\n'.join(non_empty_lines)
+    return final_text
+
+def collect_plan_cells(plan_for_age_group, months=ALL_MONTHS):
+    """Собирает ячейки плана (месяц, область, план на месяц) в том порядке, в котором они идут в документе."""
+    cells = []
+    for month in months:
+        for area, monthly_plans in plan_for_age_group.items():
+            monthly_plan = next((p for p in monthly_plans if p['month'] == month), None)
+            if not monthly_plan:
+                continue
+            cells.append((month, area, monthly_plan))
+    return cells
+
+def generate_cells_concurrently(cells, generate_cell, max_workers=None, on_cell_done=None, completed_cells=None):
+    """
+    Генерирует все ячейки параллельно (не более max_workers запросов одновременно)
+    и возвращает результаты в исходном порядке ячеек.
+    generate_cell(*cell) вызывается в рабочем потоке,
+    on_cell_done(cell, completed, total) — после завершения каждой ячейки.
+    Ячейка — кортеж (месяц, область, план на месяц); пакетная генерация добавляет
+    в начало возрастную группу. Ключ ячейки — все поля, кроме плана на месяц:
+    ячейки из completed_cells ({ключ: текст}) не генерируются повторно.
+    """
+    if max_workers is None:
+        max_workers = get_max_concurrent_cells()
+    completed_cells = completed_cells or {}
+
+    results = [None] * len(cells)
+    pending = []
+    for i, cell in enumerate(cells):
+        cell_key = cell[:-1]
+        if cell_key in completed_cells:
+            results[i] = completed_cells[cell_key]
+        else:
+            pending.append(i)
+    if not pending:
+        return results
+
+    already_done = len(cells) - len(pending)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(generate_cell, *cells[i]): i for i in pending}
+        try:
+            for completed, future in enumerate(as_completed(futures), start=already_done + 1):
+                i = futures[future]
+                results[i] = future.result()
+                if on_cell_done:
+                    on_cell_done(cells[i], completed, len(cells))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return results
+
+def iter_table_rows(cells, contents):
+    """Отдает строки таблицы (месяц, область, текст, первая ли строка месяца), пропуская пустые ячейки."""
+    previous_month = None
+    for (month, area, _), content in zip(cells, contents):
+        if content is None:
+            continue
+        yield month, area, content, month != previous_month
+        previous_month = month
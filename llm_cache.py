@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from llm_client import stream_content
+
+LLM_CACHE_PATH = "llm_cache.sqlite"
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 20000
+CACHE_MODES = ("off", "on", "replay")
+
+class CacheMissError(Exception):
+    """Ответа нет в кэше, а режим replay запрещает обращаться к API."""
+
+def get_llm_cache_mode():
+    """Режим кэша ответов из LLM_CACHE_MODE в .env: off (по умолчанию), on или replay."""
+    mode = os.getenv("LLM_CACHE_MODE", "off").strip().lower()
+    if mode not in CACHE_MODES:
+        print(f"ПРЕДУПРЕЖДЕНИЕ: неизвестный LLM_CACHE_MODE '{mode}', кэш отключен.")
+        return "off"
+    return mode
+
+def make_cache_key(model_name, prompt, generation_params=None):
+    payload = json.dumps(
+        {"model": model_name, "prompt": prompt, "params": generation_params or {}},
+        ensure_ascii=False, sort_keys=True, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMResponseCache:
+    """Кэш ответов LLM в SQLite с ограничением по времени жизни и по числу записей."""
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, response TEXT, created_at REAL, accessed_at REAL)"
+        )
+        self._connection.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._connection.commit()
+                return None
+            self._connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            return response
+
+    def put(self, key, model_name, response):
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, model_name, response, now, now),
+            )
+            self._evict(now)
+            self._connection.commit()
+
+    def _evict(self, now):
+        if self.ttl_seconds:
+            self._connection.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        (count,) = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            self._connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+class CachedResponse:
+    from_cache = True
+
+    def __init__(self, text):
+        self.text = text
+
+class CachedGenerativeModel:
+    """
+    Обертка над genai.GenerativeModel: в режиме on берет ответы из кэша и сохраняет новые,
+    в режиме replay только читает кэш и бросает CacheMissError при промахе.
+    """
+
+    def __init__(self, model, mode=None, cache=None):
+        self.model = model
+        self.mode = mode or get_llm_cache_mode()
+        self.model_name = getattr(model, "model_name", str(model))
+        self.cache = cache if cache is not None else (LLMResponseCache() if self.mode != "off" else None)
+
+    def _lookup(self, prompt, kwargs):
+        key = make_cache_key(self.model_name, prompt, kwargs)
+        cached = self.cache.get(key)
+        if cached is None and self.mode == "replay":
+            raise CacheMissError(f"Ответ для промпта отсутствует в кэше ({key[:12]}), режим replay.")
+        return key, cached
+
+    def generate_content(self, prompt, **kwargs):
+        if self.mode == "off":
+            return self.model.generate_content(prompt, **kwargs)
+
+        key, cached = self._lookup(prompt, kwargs)
+        if cached is not None:
+            return CachedResponse(cached)
+
+        response = self.model.generate_content(prompt, **kwargs)
+        self.cache.put(key, self.model_name, response.text)
+        return response
+
+    def generate_content_streaming(self, prompt, on_text=None, **kwargs):
+        """Потоковый вариант generate_content: ключ кэша тот же, ответ из кэша отдается одним фрагментом."""
+        if self.mode == "off":
+            return stream_content(self.model, prompt, on_text, **kwargs)
+
+        key, cached = self._lookup(prompt, kwargs)
+        if cached is not None:
+            if on_text:
+                on_text(cached)
+            return CachedResponse(cached)
+
+        response = stream_content(self.model, prompt, on_text, **kwargs)
+        self.cache.put(key, self.model_name, response.text)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
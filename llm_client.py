@@ -0,0 +1,240 @@
+import os
+import time
+import random
+import threading
+from context_assembler import estimate_tokens
+
+# 0 — без ограничения. Лимиты Gemini задаются на проект, например бесплатный
+# уровень gemini-1.5-flash: 15 запросов и 1 000 000 токенов в минуту.
+DEFAULT_REQUESTS_PER_MINUTE = 0
+DEFAULT_TOKENS_PER_MINUTE = 0
+DEFAULT_MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+# Несколько запросов, упершихся в лимит одновременно, — это один сигнал перегрузки, а не несколько.
+DECREASE_COOLDOWN_SECONDS = 2.0
+
+THROTTLING_STATUS_CODES = {429}
+TRANSIENT_STATUS_CODES = {500, 502, 503, 504}
+THROTTLING_ERROR_NAMES = {"ResourceExhausted", "TooManyRequests"}
+TRANSIENT_ERROR_NAMES = {"ServiceUnavailable", "InternalServerError", "DeadlineExceeded", "GatewayTimeout", "BadGateway", "ConnectionError", "Timeout", "TimeoutError"}
+
+def get_env_limit(name, default):
+    """Неотрицательное целое из .env; при некорректном значении — предупреждение и default."""
+    try:
+        value = int(os.getenv(name, default))
+    except ValueError:
+        print(f"ПРЕДУПРЕЖДЕНИЕ: некорректное значение {name}, используется {default}.")
+        value = default
+    return max(0, value)
+
+def classify_error(error):
+    """Возвращает "throttled" для превышения лимитов API, "transient" для временных сбоев и None для остальных ошибок."""
+    code = getattr(error, "code", None)
+    code = getattr(code, "value", code)
+    names = {cls.__name__ for cls in type(error).__mro__}
+    if code in THROTTLING_STATUS_CODES or names & THROTTLING_ERROR_NAMES:
+        return "throttled"
+    if code in TRANSIENT_STATUS_CODES or names & TRANSIENT_ERROR_NAMES:
+        return "transient"
+    return None
+
+def backoff_delay(attempt, base=BACKOFF_BASE_SECONDS, cap=BACKOFF_MAX_SECONDS):
+    """Экспоненциальная задержка с полным джиттером: потоки, получившие 429 одновременно, не повторяют запрос хором."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class StreamedResponse:
+    """Ответ, собранный из потока фрагментов; text — полный текст, как у обычного ответа."""
+
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+def stream_content(model, prompt, on_text=None, **kwargs):
+    """
+    Запрашивает ответ потоком (stream=True) и возвращает StreamedResponse.
+    on_text(текст) вызывается на каждом фрагменте с текстом, накопленным к этому моменту;
+    если запрос повторяется после сбоя, текст начинается заново.
+    Обертки (кэш, лимиты) передают поток дальше через свой generate_content_streaming.
+    """
+    if hasattr(type(model), "generate_content_streaming"):
+        return model.generate_content_streaming(prompt, on_text=on_text, **kwargs)
+    text = ""
+    usage_metadata = None
+    for chunk in model.generate_content(prompt, stream=True, **kwargs):
+        usage_metadata = getattr(chunk, "usage_metadata", None) or usage_metadata
+        try:
+            piece = chunk.text
+        except ValueError:
+            # Служебный фрагмент без текста, например только с причиной завершения.
+            continue
+        if piece:
+            text += piece
+            if on_text:
+                on_text(text)
+    if not text:
+        # Как и response.text у обычного ответа: пустой ответ (например, заблокированный фильтрами) — ошибка.
+        raise ValueError("Модель вернула пустой ответ.")
+    return StreamedResponse(text, usage_metadata)
+
+def stream_content_timed(model, prompt, on_text=None, **kwargs):
+    """stream_content с замером: возвращает (ответ, время до первого фрагмента, полное время) в секундах."""
+    started_at = time.perf_counter()
+    first_text_at = None
+
+    def on_chunk(text):
+        nonlocal first_text_at
+        if first_text_at is None:
+            first_text_at = time.perf_counter()
+        if on_text:
+            on_text(text)
+
+    response = stream_content(model, prompt, on_chunk, **kwargs)
+    finished_at = time.perf_counter()
+    time_to_first_token = first_text_at - started_at if first_text_at is not None else finished_at - started_at
+    return response, time_to_first_token, finished_at - started_at
+
+class TokenBucket:
+    """Ведро токенов на минутный лимит: вмещает минутную норму и пополняется равномерно."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._condition = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, amount):
+        """Ждет, пока в ведре наберется amount (не больше емкости), и списывает его."""
+        needed = min(amount, self.capacity)
+        with self._condition:
+            while True:
+                self._refill()
+                if self.tokens >= needed:
+                    self.tokens -= amount
+                    return
+                self._condition.wait((needed - self.tokens) / self.rate)
+
+    def charge(self, amount):
+        """Досписывает (или возвращает при amount < 0) разницу между оценкой и фактическим расходом."""
+        with self._condition:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+            self._condition.notify_all()
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Ограничение числа одновременных запросов по схеме AIMD: после каждого успешного
+    ответа лимит плавно растет (на 1 за «окно» из limit запросов), а при превышении
+    лимитов API сразу уменьшается вдвое.
+    """
+
+    def __init__(self, max_limit, min_limit=1):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, succeeded=True, throttled=False):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                now = time.monotonic()
+                if now - self._last_decrease >= DECREASE_COOLDOWN_SECONDS:
+                    self._last_decrease = now
+                    self.limit = max(self.min_limit, self.limit / 2)
+                    print(f"API ограничивает частоту запросов: одновременных запросов теперь не больше {int(self.limit)}.")
+            elif succeeded:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+class RateLimitedGenerativeModel:
+    """
+    Обертка над genai.GenerativeModel с общими для всех потоков лимитами:
+    ведра запросов и токенов в минуту, адаптивное число одновременных запросов
+    и повтор временных ошибок и ответов 429 с экспоненциальной задержкой.
+    Прочие ошибки (например, неверный ключ или заблокированный промпт) не повторяются.
+    """
+
+    def __init__(self, model, max_concurrency, requests_per_minute=None, tokens_per_minute=None, max_retries=None):
+        self.model = model
+        self.model_name = getattr(model, "model_name", str(model))
+        if requests_per_minute is None:
+            requests_per_minute = get_env_limit("LLM_REQUESTS_PER_MINUTE", DEFAULT_REQUESTS_PER_MINUTE)
+        if tokens_per_minute is None:
+            tokens_per_minute = get_env_limit("LLM_TOKENS_PER_MINUTE", DEFAULT_TOKENS_PER_MINUTE)
+        self.max_retries = get_env_limit("LLM_MAX_RETRIES", DEFAULT_MAX_RETRIES) if max_retries is None else max_retries
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrencyLimiter(max_concurrency)
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "failed": 0}
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _used_tokens(self, prompt, response):
+        usage = getattr(response, "usage_metadata", None)
+        total = getattr(usage, "total_token_count", None)
+        if total:
+            return total
+        return estimate_tokens(prompt) + estimate_tokens(getattr(response, "text", "") or "")
+
+    def generate_content(self, prompt, **kwargs):
+        return self._request(prompt, lambda: self.model.generate_content(prompt, **kwargs))
+
+    def generate_content_streaming(self, prompt, on_text=None, **kwargs):
+        return self._request(prompt, lambda: stream_content(self.model, prompt, on_text, **kwargs))
+
+    def _request(self, prompt, send):
+        prompt_text = prompt if isinstance(prompt, str) else str(prompt)
+        reserved_tokens = estimate_tokens(prompt_text)
+        attempt = 0
+        while True:
+            if self.request_bucket:
+                self.request_bucket.acquire(1)
+            if self.token_bucket:
+                self.token_bucket.acquire(reserved_tokens)
+            self.concurrency.acquire()
+            self._count("requests")
+            try:
+                response = send()
+            except Exception as e:
+                kind = classify_error(e)
+                self.concurrency.release(succeeded=False, throttled=kind == "throttled")
+                if self.token_bucket:
+                    # Отклоненный запрос не расходует токены, резерв возвращается в ведро.
+                    self.token_bucket.charge(-reserved_tokens)
+                if kind == "throttled":
+                    self._count("throttled")
+                if kind is None or attempt >= self.max_retries:
+                    self._count("failed")
+                    raise
+                delay = backoff_delay(attempt)
+                attempt += 1
+                self._count("retries")
+                print(f"Временная ошибка Gemini ({type(e).__name__}), повтор {attempt}/{self.max_retries} через {delay:.1f} с: {e}")
+                time.sleep(delay)
+                continue
+
+            self.concurrency.release()
+            if self.token_bucket:
+                self.token_bucket.charge(self._used_tokens(prompt_text, response) - reserved_tokens)
+            return response
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
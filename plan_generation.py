@@ -0,0 +1,98 @@
+import json
+import time
+from retrieval import prefetch_plan_context
+from resources import ResourceManager
+from llm_client import stream_content_timed
+from run_metrics import RunMetrics, build_cell_metrics
+from area_registry import load_area_registry
+from run_journal import open_run_journal, safe_group_name
+from plan_renderers import write_plan_outputs
+from generation_engine import ALL_MONTHS, clean_text, collect_plan_cells, generate_cells_concurrently, iter_table_rows
+
+# Общая генерация плана для окон main.py и gui.py.
+GENERATIVE_MODEL_NAME = "gemini-2.0-flash"
+YEAR = "2025-2026"
+
+def run_generation_process(age_group, update_queue, resume=False, resources=None):
+    """
+    Генерирует годовой план одной группы и "общается" с окном приложения через очередь
+    update_queue: сообщения status, progress, preview, done и error.
+    resources — ResourceManager сессии приложения: модели и индекс, загруженные
+    при прошлых генерациях, используются повторно.
+    """
+    try:
+        run_metrics = RunMetrics()
+        update_queue.put(("status", "Шаг 0/4: Настройка системы..."))
+        resources = resources or ResourceManager(GENERATIVE_MODEL_NAME)
+        if resources.is_warming_up():
+            update_queue.put(("status", "Шаг 0/4: Ожидание фоновой загрузки моделей..."))
+        with run_metrics.stage("models"):
+            embedding_model, faiss_index, documents, generative_model = resources.get()
+        if not all((embedding_model, faiss_index, documents, generative_model)):
+            raise Exception("Ошибка инициализации моделей или базы знаний.")
+
+        update_queue.put(("status", "Шаг 1/4: Загрузка учебной программы..."))
+        with run_metrics.stage("curriculum"):
+            with open("curriculum_map.json", "r", encoding="utf-8") as f:
+                curriculum_map = json.load(f)
+            areas = load_area_registry()
+
+        plan_for_age_group = curriculum_map.get(age_group)
+        if not plan_for_age_group:
+            raise Exception(f"Не найдена программа для группы '{age_group}'")
+
+        cells = collect_plan_cells(plan_for_age_group, ALL_MONTHS)
+        journal = open_run_journal(age_group, resume=resume)
+        run_metrics.attach_journal(journal)
+        pending_cells = [cell for cell in cells if (cell[0], cell[1]) not in journal.completed_cells]
+
+        update_queue.put(("status", "Шаг 2/4: Поиск методик в базе знаний..."))
+        context_stats = {}
+        with run_metrics.stage("retrieval"), run_metrics.count_delta(getattr(embedding_model, "cache", None), ("hits", "misses"), "embedding_cache"):
+            contexts = prefetch_plan_context(pending_cells, areas, age_group, embedding_model, faiss_index, documents, cell_stats=context_stats)
+
+        update_queue.put(("status", "Шаг 3/4: Начало генерации контента..."))
+
+        def generate_cell(month, area, monthly_plan):
+            area_spec = areas.get(area)
+            if area_spec is None or (month, area) not in contexts:
+                return None
+
+            prompt_started_at = time.perf_counter()
+            prompt = area_spec.render_prompt(contexts[(month, area)], month, monthly_plan)
+            prompt_seconds = time.perf_counter() - prompt_started_at
+
+            def on_text(text):
+                update_queue.put(("preview", (month, area, text)))
+
+            response, time_to_first_token, generation_seconds = stream_content_timed(generative_model, prompt, on_text)
+            print(f"Ячейка {month} / {area}: первый фрагмент через {time_to_first_token:.2f} с, ответ целиком за {generation_seconds:.2f} с.")
+            cell_content = clean_text(response.text)
+            cell_metrics = build_cell_metrics(
+                prompt, response, context_stats.get((month, area)),
+                prompt_seconds=prompt_seconds, time_to_first_token=time_to_first_token, generation_seconds=generation_seconds,
+            )
+            run_metrics.add_cell(month, area, cell_metrics)
+            journal.record_cell(month, area, cell_content, metrics=cell_metrics)
+            return cell_content
+
+        def on_cell_done(cell, completed, total):
+            month, area, _ = cell
+            update_queue.put(("status", f"Сгенерировано: {month} / {area} ({completed}/{total})"))
+            update_queue.put(("progress", (completed / total) * 100))
+
+        with run_metrics.stage("generation"), run_metrics.count_delta(generative_model, ("retries", "throttled", "failed"), "llm"):
+            contents = generate_cells_concurrently(cells, generate_cell, on_cell_done=on_cell_done, completed_cells=journal.completed_cells)
+
+        update_queue.put(("status", "Шаг 4/4: Сохранение плана..."))
+        with run_metrics.stage("document"):
+            output_files = write_plan_outputs(f"Годовой_Перспективный_план_{safe_group_name(age_group)}", [(age_group, iter_table_rows(cells, contents))], YEAR)
+        output_filename = ", ".join(output_files)
+        print(run_metrics.finish())
+        journal.mark_finished(output_filename)
+
+        update_queue.put(("status", f"Готово! План сохранен: {output_filename}"))
+        update_queue.put(("done", output_filename))
+
+    except Exception as e:
+        update_queue.put(("error", str(e)))
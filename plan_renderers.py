@@ -0,0 +1,271 @@
+import os
+import csv
+import json
+from abc import ABC, abstractmethod
+from html import escape as escape_html
+from docx_writer import TABLE_HEADERS, StreamingDocxWriter
+
+DEFAULT_OUTPUT_FORMATS = ("docx",)
+# Поля ячейки в машиночитаемых форматах (JSON, JSONL, CSV).
+CELL_FIELDS = ("age_group", "month", "area", "content")
+
+def get_output_formats():
+    """Форматы вывода из OUTPUT_FORMATS в .env через запятую, например "docx,json"; по умолчанию только docx."""
+    value = os.getenv("OUTPUT_FORMATS", "")
+    formats = []
+    for name in value.split(","):
+        name = name.strip().lower().lstrip(".")
+        if not name:
+            continue
+        if name not in RENDERERS:
+            print(f"ПРЕДУПРЕЖДЕНИЕ: неизвестный формат вывода '{name}' пропущен. Доступны: {', '.join(RENDERERS)}.")
+        elif name not in formats:
+            formats.append(name)
+    return formats or list(DEFAULT_OUTPUT_FORMATS)
+
+def parse_output_formats(value):
+    """Разбирает список форматов из командной строки; неизвестный формат — ValueError."""
+    formats = [name.strip().lower().lstrip(".") for name in value.split(",") if name.strip()]
+    unknown = [name for name in formats if name not in RENDERERS]
+    if unknown or not formats:
+        raise ValueError(f"Неизвестный формат вывода: {', '.join(unknown) or value}. Доступны: {', '.join(RENDERERS)}.")
+    return list(dict.fromkeys(formats))
+
+class PlanRenderer(ABC):
+    """
+    Писатель готового плана в один формат. Строки таблицы плана приходят по одной
+    (begin_group перед строками каждой группы, затем add_row) и сразу уходят в файл,
+    поэтому план не собирается в памяти целиком. Файл пишется во временный
+    path + ".part" и появляется под своим именем только после close().
+    Подкласс с собственным способом записи переопределяет _open, close и abort.
+    """
+
+    extension = None
+    newline = None
+    encoding = "utf-8"
+
+    def __init__(self, path, age_groups, year):
+        self.path = path
+        self.age_groups = list(age_groups)
+        self.year = year
+        self.age_group = None
+        self._temp_path = path + ".part"
+        self._open()
+        self.start()
+
+    def _open(self):
+        self._file = open(self._temp_path, "w", encoding=self.encoding, newline=self.newline)
+
+    def start(self):
+        pass
+
+    def begin_group(self, age_group):
+        self.age_group = age_group
+
+    @abstractmethod
+    def add_row(self, month, area, content, is_first_entry_for_month=False):
+        pass
+
+    def finish(self):
+        pass
+
+    def close(self):
+        self.finish()
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+
+    def abort(self):
+        try:
+            self._file.close()
+        except Exception:
+            pass
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+    @property
+    def title(self):
+        return f"Перспективный план организованной деятельности на {self.year} учебный год"
+
+class JsonRenderer(PlanRenderer):
+    """Один JSON-документ: год и список групп, у каждой — ячейки плана по порядку."""
+
+    extension = "json"
+
+    def start(self):
+        self._file.write('{"year": ' + json.dumps(self.year, ensure_ascii=False) + ', "groups": [')
+        self._groups_written = 0
+        self._cells_written = 0
+
+    def begin_group(self, age_group):
+        if self.age_group is not None:
+            self._file.write("]}")
+        super().begin_group(age_group)
+        self._file.write((", " if self._groups_written else "") + '{"age_group": ' + json.dumps(age_group, ensure_ascii=False) + ', "cells": [')
+        self._groups_written += 1
+        self._cells_written = 0
+
+    def add_row(self, month, area, content, is_first_entry_for_month=False):
+        cell = {"month": month, "area": area, "content": content}
+        self._file.write((", " if self._cells_written else "") + json.dumps(cell, ensure_ascii=False))
+        self._cells_written += 1
+
+    def finish(self):
+        if self.age_group is not None:
+            self._file.write("]}")
+        self._file.write("]}\n")
+
+class JsonlRenderer(PlanRenderer):
+    """По одной ячейке на строку: удобно загружать построчно и дописывать."""
+
+    extension = "jsonl"
+
+    def add_row(self, month, area, content, is_first_entry_for_month=False):
+        cell = dict(zip(CELL_FIELDS, (self.age_group, month, area, content)), year=self.year)
+        self._file.write(json.dumps(cell, ensure_ascii=False) + "\n")
+
+class CsvRenderer(PlanRenderer):
+    """CSV с заголовком из CELL_FIELDS; UTF-8 с BOM, чтобы Excel правильно открыл кириллицу."""
+
+    extension = "csv"
+    newline = ""
+    encoding = "utf-8-sig"
+
+    def start(self):
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(CELL_FIELDS)
+
+    def add_row(self, month, area, content, is_first_entry_for_month=False):
+        self._writer.writerow((self.age_group, month, area, content))
+
+class MarkdownRenderer(PlanRenderer):
+    """
+    Markdown-таблица на каждую группу; месяц пишется только в первой строке месяца, как в .docx.
+    Текст ячеек экранируется как HTML: просмотрщики Markdown показали бы теги из ответа модели как разметку.
+    """
+
+    extension = "md"
+
+    @staticmethod
+    def _cell(text):
+        return escape_html(text, quote=False).replace("|", "\\|").replace("\n", "<br>")
+
+    def start(self):
+        self._file.write(f"# {self.title}\n")
+
+    def begin_group(self, age_group):
+        super().begin_group(age_group)
+        self._file.write(f"\n## Группа: {age_group}\n\n")
+        self._file.write("| " + " | ".join(TABLE_HEADERS) + " |\n|" + "---|" * len(TABLE_HEADERS) + "\n")
+
+    def add_row(self, month, area, content, is_first_entry_for_month=False):
+        month_text = self._cell(month) if is_first_entry_for_month else ""
+        self._file.write(f"| {month_text} | {self._cell(area)} | {self._cell(content)} |\n")
+
+class HtmlRenderer(PlanRenderer):
+    """
+    Самостоятельная HTML-страница с таблицей на каждую группу. Ячейка месяца
+    объединяется на все его строки через rowspan, поэтому строки текущего месяца
+    (не больше числа областей) держатся в буфере до начала следующего.
+    """
+
+    extension = "html"
+
+    def start(self):
+        self._month_rows = []
+        self._file.write(
+            '<!DOCTYPE html>\n<html lang="ru">\n<head>\n<meta charset="utf-8">\n'
+            f"<title>{escape_html(self.title)}</title>\n"
+            "<style>body{font-family:sans-serif}table{border-collapse:collapse;width:100%}"
+            "th,td{border:1px solid #999;padding:4px;vertical-align:top;text-align:left}</style>\n"
+            f"</head>\n<body>\n<h1>{escape_html(self.title)}</h1>\n"
+        )
+
+    def _flush_month(self):
+        if not self._month_rows:
+            return
+        month = self._month_rows[0][0]
+        for row_number, (_, area, content) in enumerate(self._month_rows):
+            month_cell = f'<td rowspan="{len(self._month_rows)}">{escape_html(month)}</td>' if row_number == 0 else ""
+            content_html = escape_html(content).replace("\n", "<br>")
+            self._file.write(f"<tr>{month_cell}<td>{escape_html(area)}</td><td>{content_html}</td></tr>\n")
+        self._month_rows = []
+
+    def _close_table(self):
+        if self.age_group is not None:
+            self._flush_month()
+            self._file.write("</tbody>\n</table>\n")
+
+    def begin_group(self, age_group):
+        self._close_table()
+        super().begin_group(age_group)
+        header = "".join(f"<th>{escape_html(title)}</th>" for title in TABLE_HEADERS)
+        self._file.write(f"<h2>Группа: {escape_html(age_group)}</h2>\n<table>\n<thead><tr>{header}</tr></thead>\n<tbody>\n")
+
+    def add_row(self, month, area, content, is_first_entry_for_month=False):
+        if is_first_entry_for_month:
+            self._flush_month()
+        self._month_rows.append((month, area, content))
+
+    def finish(self):
+        self._close_table()
+        self._file.write("</body>\n</html>\n")
+
+class DocxRenderer(PlanRenderer):
+    """.docx через StreamingDocxWriter; в общем плане нескольких групп перед каждой группой идет строка с ее названием."""
+
+    extension = "docx"
+
+    def _open(self):
+        # StreamingDocxWriter сам пишет во временный path + ".part" и заменяет им path при закрытии.
+        self._writer = StreamingDocxWriter(self.path, ", ".join(self.age_groups), self.year)
+
+    def begin_group(self, age_group):
+        super().begin_group(age_group)
+        if len(self.age_groups) > 1:
+            self._writer.add_section_row(age_group)
+
+    def add_row(self, month, area, content, is_first_entry_for_month=False):
+        self._writer.add_row(month, area, content, is_first_entry_for_month)
+
+    def close(self):
+        self._writer.close()
+
+    def abort(self):
+        self._writer.abort()
+
+RENDERERS = {renderer.extension: renderer for renderer in (DocxRenderer, JsonRenderer, JsonlRenderer, CsvRenderer, MarkdownRenderer, HtmlRenderer)}
+
+def write_plan_outputs(base_path, plan_groups, year, formats=None):
+    """
+    Сохраняет план во всех форматах за один проход по строкам.
+    base_path — имя файла без расширения; plan_groups — список (группа, строки),
+    где строки — (месяц, область, текст, первая ли строка месяца), как их выдает
+    iter_table_rows. Возвращает имена сохраненных файлов. Если запись прервалась,
+    недописанные файлы удаляются, а уже существующие файлы с теми же именами не трогаются.
+    """
+    formats = formats or get_output_formats()
+    age_groups = [age_group for age_group, _ in plan_groups]
+    renderers = []
+    try:
+        for name in formats:
+            renderer_class = RENDERERS[name]
+            renderers.append(renderer_class(f"{base_path}.{renderer_class.extension}", age_groups, year))
+        for age_group, rows in plan_groups:
+            for renderer in renderers:
+                renderer.begin_group(age_group)
+            for row in rows:
+                for renderer in renderers:
+                    renderer.add_row(*row)
+    except BaseException:
+        for renderer in renderers:
+            renderer.abort()
+        raise
+    for position, renderer in enumerate(renderers):
+        try:
+            renderer.close()
+        except BaseException:
+            # Упавший и еще не закрытые писатели удаляют свои .part; уже сохраненные файлы остаются.
+            for unfinished in renderers[position:]:
+                unfinished.abort()
+            raise
+    return [renderer.path for renderer in renderers]
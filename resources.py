@@ -0,0 +1,176 @@
+import os
+import threading
+from concurrent.futures import Future
+from dotenv import load_dotenv
+from chunk_store import CHUNK_STORE_DIR, META_FILE, ChunkStore
+from embedding_cache import CachedEmbeddingModel
+from llm_cache import CachedGenerativeModel, get_llm_cache_mode
+from llm_client import RateLimitedGenerativeModel
+from generation_engine import get_max_concurrent_cells
+from retrieval import EMBEDDING_MODEL_NAME
+
+FAISS_INDEX_PATH = "faiss_index.bin"
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class ResourceManager:
+    """
+    Долгоживущие ресурсы генерации: модель эмбеддингов, индекс FAISS, хранилище чанков
+    и модель Gemini. Каждый ресурс загружается при первом обращении и затем
+    переиспользуется всеми генерациями сессии. Если build_index.py пересобрал индекс,
+    индекс и хранилище чанков перечитываются при следующем get().
+    Ресурс, который не удалось загрузить, не запоминается: следующий get() попробует снова.
+    """
+
+    def __init__(self, generative_model_name="gemini-2.0-flash", index_path=FAISS_INDEX_PATH, chunk_store_dir=CHUNK_STORE_DIR):
+        self.generative_model_name = generative_model_name
+        self.index_path = index_path
+        self.chunk_store_dir = chunk_store_dir
+        self._lock = threading.RLock()
+        self._embedding_model = None
+        self._faiss_index = None
+        self._documents = None
+        self._generative_model = None
+        self._index_signature = None
+        self._warmup_future = None
+
+    def index_signature(self):
+        """Отпечаток файлов индекса на диске; meta.json хранилища build_index.py пишет последним."""
+        return file_signature(self.index_path), file_signature(os.path.join(self.chunk_store_dir, META_FILE))
+
+    def reload(self):
+        """Сбрасывает индекс и хранилище чанков, чтобы следующий get() прочитал их с диска заново."""
+        with self._lock:
+            self._faiss_index = None
+            self._documents = None
+            self._index_signature = None
+
+    def _load_generative_model(self):
+        import google.generativeai as genai
+
+        load_dotenv()
+        llm_cache_mode = get_llm_cache_mode()
+        gemini_api_key = os.getenv("GEMINI_API_KEY")
+        if gemini_api_key:
+            genai.configure(api_key=gemini_api_key)
+            print("API ключ Gemini загружен.")
+        elif llm_cache_mode == "replay":
+            print("API ключ Gemini не задан: ответы будут браться только из кэша (LLM_CACHE_MODE=replay).")
+        else:
+            print("ОШИБКА: API ключ GEMINI не найден. Создайте файл .env и добавьте GEMINI_API_KEY=ваш_ключ")
+            return None
+        if llm_cache_mode != "off":
+            print(f"Кэш ответов LLM включен (режим {llm_cache_mode}).")
+        # Кэш снаружи: ответы из кэша не расходуют лимиты API.
+        model = RateLimitedGenerativeModel(genai.GenerativeModel(self.generative_model_name), max_concurrency=get_max_concurrent_cells())
+        return CachedGenerativeModel(model, mode=llm_cache_mode)
+
+    def get_embedding_model(self):
+        with self._lock:
+            if self._embedding_model is None:
+                # sentence_transformers тянет за собой torch: импорт стоит секунды, поэтому он здесь, а не в начале модуля.
+                from sentence_transformers import SentenceTransformer
+                self._embedding_model = CachedEmbeddingModel(SentenceTransformer(EMBEDDING_MODEL_NAME), EMBEDDING_MODEL_NAME)
+                print("Модель для эмбеддингов загружена.")
+            return self._embedding_model
+
+    def get_knowledge_base(self):
+        """Возвращает (индекс FAISS, хранилище чанков), перечитывая их, если файлы на диске изменились."""
+        with self._lock:
+            signature = self.index_signature()
+            if self._index_signature is not None and signature != self._index_signature:
+                print("Файлы индекса изменились на диске, база знаний будет загружена заново.")
+                self.reload()
+
+            if self._faiss_index is None:
+                import faiss
+                try:
+                    self._faiss_index = faiss.read_index(self.index_path)
+                    print(f"Векторная база FAISS загружена. В ней {self._faiss_index.ntotal} документов.")
+                except Exception as e:
+                    print(f"ОШИБКА: не удалось загрузить {self.index_path}. Убедитесь, что файл существует. {e}")
+                    self.reload()
+                    return None, None
+            if self._documents is None:
+                try:
+                    self._documents = ChunkStore(self.chunk_store_dir)
+                    print(f"Хранилище чанков открыто. Всего {len(self._documents)} фрагментов.")
+                except Exception as e:
+                    print(f"ОШИБКА: не удалось открыть хранилище чанков '{self.chunk_store_dir}'. Запустите build_index.py. {e}")
+                    self.reload()
+                    return None, None
+            self._index_signature = signature
+            return self._faiss_index, self._documents
+
+    def get_generative_model(self):
+        with self._lock:
+            if self._generative_model is None:
+                self._generative_model = self._load_generative_model()
+            return self._generative_model
+
+    def start_warmup(self, on_status=None):
+        """
+        Начинает загрузку модели эмбеддингов, индекса и хранилища чанков в фоновом потоке
+        и возвращает Future с результатом (True, если база знаний загружена).
+        on_status(текст) вызывается из фонового потока на каждом этапе.
+        Повторный вызов возвращает уже запущенный Future.
+        """
+        with self._lock:
+            if self._warmup_future is not None:
+                return self._warmup_future
+            future = self._warmup_future = Future()
+
+        def report(text):
+            print(text)
+            if on_status:
+                on_status(text)
+
+        def warm_up():
+            future.set_running_or_notify_cancel()
+            try:
+                report("Фоновая загрузка: модель эмбеддингов...")
+                self.get_embedding_model()
+                report("Фоновая загрузка: индекс FAISS и хранилище чанков...")
+                faiss_index, documents = self.get_knowledge_base()
+                if faiss_index is None:
+                    report("Базу знаний загрузить не удалось, подробности в консоли.")
+                    future.set_result(False)
+                else:
+                    report(f"Модели загружены, в базе знаний {faiss_index.ntotal} фрагментов. Готов к работе.")
+                    future.set_result(True)
+            except BaseException as e:
+                report(f"Ошибка фоновой загрузки моделей: {e}")
+                future.set_exception(e)
+
+        # Поток-демон не задерживает закрытие окна, пока модель еще загружается.
+        threading.Thread(target=warm_up, name="resource-warmup", daemon=True).start()
+        return future
+
+    def is_warming_up(self):
+        return self._warmup_future is not None and not self._warmup_future.done()
+
+    def wait_for_warmup(self):
+        """Дожидается фоновой загрузки, если она запущена. Ее ошибку get() воспроизведет сам, загружая ресурс заново."""
+        future = self._warmup_future
+        if future is not None:
+            try:
+                future.result()
+            except Exception:
+                pass
+
+    def get(self):
+        """Возвращает (embedding_model, faiss_index, documents, generative_model); при ошибке загрузки — None на месте ресурса."""
+        # Ждать нужно до захвата блокировки: ее держит фоновый поток, пока грузит модели.
+        self.wait_for_warmup()
+        with self._lock:
+            generative_model = self.get_generative_model()
+            if generative_model is None:
+                return None, None, None, None
+            embedding_model = self.get_embedding_model()
+            faiss_index, documents = self.get_knowledge_base()
+            return embedding_model, faiss_index, documents, generative_model
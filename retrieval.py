@@ -0,0 +1,94 @@
+import time
+import numpy as np
+from collections import namedtuple
+from context_assembler import assemble_context
+
+SearchHit = namedtuple("SearchHit", ["chunk_id", "chunk", "score"])
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+def get_search_topics(monthly_plan):
+    return monthly_plan.get("key_topics", []) + monthly_plan.get("reinforcement_topics", [])
+
+def is_cosine_index(faiss_index):
+    """Индекс построен по нормированным векторам со скалярным произведением (косинусная близость)."""
+    import faiss
+    return faiss_index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+def search_hits(queries, k, embedding_model, faiss_index, documents):
+    """
+    Ищет по списку запросов за один проход: один вызов encode и один поиск FAISS
+    по матрице запросов. Для каждого запроса возвращает список SearchHit от лучшего к худшему;
+    порог близости области применяет вызывающий код.
+    """
+    if not queries:
+        return []
+    query_vectors = np.ascontiguousarray(embedding_model.encode(list(queries)), dtype='float32')
+    cosine = is_cosine_index(faiss_index)
+    if cosine:
+        import faiss
+        query_vectors = query_vectors.copy()
+        faiss.normalize_L2(query_vectors)
+    scores, indices = faiss_index.search(query_vectors, k)
+
+    return [
+        [
+            SearchHit(int(i), documents[i], float(score)) for i, score in zip(row_indices, row_scores) if i != -1
+        ]
+        for row_scores, row_indices in zip(scores, indices)
+    ]
+
+def prefetch_plan_context(cells, areas, age_group, embedding_model, faiss_index, documents, cell_stats=None):
+    """
+    Собирает запросы всех ячеек плана, выполняет их одним векторизованным проходом
+    и возвращает готовый контекст для каждой ячейки: {(месяц, область): контекст}.
+    areas — реестр областей ({название: AreaSpec}); ячейки областей, которых
+    нет в реестре, в результат не попадают.
+    В cell_stats (если передан) для каждой ячейки кладутся счетчики assemble_context
+    и below_threshold.
+    """
+    start_time = time.perf_counter()
+
+    unique_queries = {}
+    cell_queries = []
+    max_k = 0
+    for month, area, monthly_plan in cells:
+        area_spec = areas.get(area)
+        if area_spec is None:
+            continue
+        queries = area_spec.build_queries(age_group, get_search_topics(monthly_plan))
+        for query in queries:
+            unique_queries.setdefault(query, len(unique_queries))
+        cell_queries.append(((month, area), monthly_plan, queries, area_spec.k, area_spec.min_score))
+        max_k = max(max_k, area_spec.k)
+
+    # FAISS возвращает соседей от лучшего к худшему, поэтому один поиск с max_k
+    # покрывает все области: для каждой берем первые k результатов и применяем ее порог.
+    # Порог применяется только к косинусному индексу: у индекса старого формата (L2) оценка — это расстояние.
+    results = search_hits(list(unique_queries), max_k, embedding_model, faiss_index, documents)
+    cosine = is_cosine_index(faiss_index)
+
+    contexts = {}
+    stats = {}
+    for cell_key, monthly_plan, queries, k, min_score in cell_queries:
+        cell_stat = {"below_threshold": 0}
+        hits_per_topic = []
+        for query in queries:
+            hits = results[unique_queries[query]][:k]
+            relevant = [hit for hit in hits if not cosine or hit.score >= min_score]
+            cell_stat["below_threshold"] += len(hits) - len(relevant)
+            hits_per_topic.append(relevant)
+        contexts[cell_key] = assemble_context(
+            monthly_plan.get("key_topics", []), monthly_plan.get("reinforcement_topics", []), hits_per_topic, stats=cell_stat,
+        )
+        for name, value in cell_stat.items():
+            stats[name] = stats.get(name, 0) + value
+        if cell_stats is not None:
+            cell_stats[cell_key] = cell_stat
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Предвыборка контекста: {len(unique_queries)} запросов для {len(contexts)} ячеек за {elapsed:.2f} с.")
+    if contexts:
+        print(f"  - Найдено фрагментов: {stats['found'] + stats['below_threshold']}, ниже порога близости: {stats['below_threshold']}, "
+              f"повторов между темами: {stats['duplicates']}, склеено соседних: {stats['merged']}, не вошло в лимит токенов: {stats['over_budget']}.")
+    return contexts
@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import threading
+
+RUNS_DIR = "runs/"
+
+def safe_group_name(age_group):
+    return age_group.replace(' ', '_').replace('(', '').replace(')', '').replace('/', '_')
+
+class RunJournal:
+    """
+    Журнал прогона генерации: каждая готовая ячейка сразу дописывается в JSONL-файл
+    runs/<группа>/<ID прогона>.jsonl, чтобы после сбоя продолжить с того же места.
+    """
+
+    def __init__(self, age_group, run_id=None, runs_dir=RUNS_DIR):
+        self.age_group = age_group
+        self.directory = os.path.join(runs_dir, safe_group_name(age_group))
+        self.run_id = run_id or self._new_run_id()
+        self.path = os.path.join(self.directory, f"{self.run_id}.jsonl")
+        self._lock = threading.Lock()
+        self.completed_cells = {}
+        self.is_finished = False
+        self._needs_newline = False
+
+        if os.path.exists(self.path):
+            self._load()
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            self._append({"type": "run", "age_group": age_group, "run_id": self.run_id, "started_at": time.time()})
+
+    def _new_run_id(self):
+        # Повторная генерация может начаться в ту же секунду, что и предыдущая.
+        base_id = run_id = time.strftime("%Y%m%d-%H%M%S")
+        suffix = 1
+        while os.path.exists(os.path.join(self.directory, f"{run_id}.jsonl")):
+            suffix += 1
+            run_id = f"{base_id}-{suffix}"
+        return run_id
+
+    def _load(self):
+        # Файл только читается: журналы открываются и при поиске прогона для продолжения.
+        with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                self._needs_newline = not line.endswith("\n")
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Последняя строка могла быть записана не полностью в момент сбоя.
+                    continue
+                if record.get("type") == "cell":
+                    self.completed_cells[(record["month"], record["area"])] = record["content"]
+                elif record.get("type") == "finished":
+                    self.is_finished = True
+
+    def _append(self, record):
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                if self._needs_newline:
+                    # Оборванная при сбое последняя строка не должна склеиться с новой записью.
+                    f.write("\n")
+                    self._needs_newline = False
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def record_cell(self, month, area, content, metrics=None):
+        """Сохраняет готовую ячейку в журнал; metrics — замеры генерации (время до первого фрагмента и т. п.)."""
+        record = {"type": "cell", "month": month, "area": area, "content": content}
+        if metrics:
+            record["metrics"] = metrics
+        self._append(record)
+        with self._lock:
+            self.completed_cells[(month, area)] = content
+
+    def record_stage(self, stage, seconds):
+        """Сохраняет время этапа прогона (загрузка моделей, поиск, генерация, сохранение)."""
+        self._append({"type": "stage", "stage": stage, "seconds": round(seconds, 3)})
+
+    def record_summary(self, summary):
+        self._append({"type": "summary", **summary})
+
+    def mark_finished(self, output_filename):
+        self._append({"type": "finished", "output": output_filename, "finished_at": time.time()})
+        self.is_finished = True
+
+def run_id_sort_key(run_id):
+    """ID прогона — время запуска и, для запусков в одну секунду, номер: 20250901-120000-2."""
+    date, _, rest = run_id.partition("-")
+    time_part, _, suffix = rest.partition("-")
+    return date, time_part, int(suffix) if suffix.isdigit() else 1
+
+def find_unfinished_run(age_group, runs_dir=RUNS_DIR):
+    """
+    Возвращает ID последнего прогона группы, если он не завершен, иначе None.
+    Более старые незавершенные прогоны не продолжаются: после них план уже был собран заново.
+    """
+    directory = os.path.join(runs_dir, safe_group_name(age_group))
+    if not os.path.isdir(directory):
+        return None
+    run_ids = [os.path.splitext(f)[0] for f in os.listdir(directory) if f.endswith(".jsonl")]
+    if not run_ids:
+        return None
+    latest_run_id = max(run_ids, key=run_id_sort_key)
+    if RunJournal(age_group, latest_run_id, runs_dir).is_finished:
+        return None
+    return latest_run_id
+
+def open_run_journal(age_group, resume=False, runs_dir=RUNS_DIR):
+    """Открывает журнал незавершенного прогона (если resume и он есть) или начинает новый."""
+    run_id = find_unfinished_run(age_group, runs_dir) if resume else None
+    journal = RunJournal(age_group, run_id, runs_dir)
+    if run_id:
+        print(f"Продолжение прогона {run_id}: уже готово ячеек — {len(journal.completed_cells)}.")
+    else:
+        print(f"Новый прогон {journal.run_id}, журнал: {journal.path}")
+    return journal
@@ -0,0 +1,147 @@
+import time
+import threading
+from contextlib import contextmanager
+from context_assembler import estimate_tokens
+
+SLOWEST_CELLS_IN_REPORT = 5
+
+def token_counts(prompt, response):
+    """
+    Возвращает (токены промпта, токены ответа, оценка ли это).
+    Точные числа берутся из usage_metadata ответа Gemini; у ответа из кэша
+    его нет, и тогда токены оцениваются по длине текста.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", None)
+    response_tokens = getattr(usage, "candidates_token_count", None)
+    if prompt_tokens and response_tokens:
+        return prompt_tokens, response_tokens, False
+    return estimate_tokens(prompt), estimate_tokens(response.text), True
+
+def build_cell_metrics(prompt, response, context_stats=None, **timings):
+    """
+    Показатели одной ячейки для журнала прогона: время этапов (timings в секундах),
+    токены промпта и ответа, число найденных и использованных чанков, попадание в кэш LLM.
+    """
+    prompt_tokens, response_tokens, estimated = token_counts(prompt, response)
+    context_stats = context_stats or {}
+    metrics = {name: round(seconds, 3) for name, seconds in timings.items()}
+    metrics.update({
+        "prompt_tokens": prompt_tokens,
+        "response_tokens": response_tokens,
+        "tokens_estimated": estimated,
+        "retrieved_chunks": context_stats.get("found", 0),
+        "context_chunks": context_stats.get("used_chunks", 0),
+        "context_tokens": context_stats.get("context_tokens", 0),
+        "llm_cache_hit": bool(getattr(response, "from_cache", False)),
+    })
+    return metrics
+
+class RunMetrics:
+    """
+    Замеры одного прогона генерации: время этапов, показатели ячеек и счетчики
+    кэшей и повторов. Этапы и итоговая сводка пишутся в журнал прогона
+    рядом с ячейками, поэтому весь прогон разбирается по одному JSONL-файлу.
+    """
+
+    def __init__(self, journal=None):
+        self.journal = journal
+        self.started_at = time.perf_counter()
+        self.stages = {}
+        self.cells = []
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def attach_journal(self, journal):
+        """Подключает журнал, открытый уже после первых этапов, и дописывает в него их время."""
+        self.journal = journal
+        for name, seconds in self.stages.items():
+            journal.record_stage(name, seconds)
+
+    @contextmanager
+    def stage(self, name):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started_at
+            self.stages[name] = self.stages.get(name, 0) + seconds
+            if self.journal:
+                self.journal.record_stage(name, seconds)
+
+    @contextmanager
+    def count_delta(self, source, names, prefix):
+        """Добавляет в счетчики прирост атрибутов-счетчиков source (или его словаря stats) за время блока."""
+        def snapshot():
+            stats = getattr(source, "stats", None)
+            if isinstance(stats, dict):
+                return {name: stats.get(name, 0) for name in names}
+            return {name: getattr(source, name, 0) for name in names}
+
+        before = snapshot() if source is not None else None
+        try:
+            yield
+        finally:
+            if before is not None:
+                after = snapshot()
+                with self._lock:
+                    for name in names:
+                        key = f"{prefix}_{name}"
+                        self.counters[key] = self.counters.get(key, 0) + after[name] - before[name]
+
+    def add_cell(self, month, area, metrics):
+        with self._lock:
+            self.cells.append({"month": month, "area": area, **metrics})
+
+    def summary(self):
+        with self._lock:
+            cells = list(self.cells)
+            counters = dict(self.counters)
+        slowest = sorted(cells, key=lambda cell: cell.get("generation_seconds", 0), reverse=True)[:SLOWEST_CELLS_IN_REPORT]
+        return {
+            "total_seconds": round(time.perf_counter() - self.started_at, 3),
+            "stages": {name: round(seconds, 3) for name, seconds in self.stages.items()},
+            "cells_generated": len(cells),
+            "llm_cache_hits": sum(cell["llm_cache_hit"] for cell in cells),
+            "prompt_tokens": sum(cell["prompt_tokens"] for cell in cells),
+            "response_tokens": sum(cell["response_tokens"] for cell in cells),
+            "tokens_estimated": any(cell["tokens_estimated"] for cell in cells),
+            "retrieved_chunks": sum(cell["retrieved_chunks"] for cell in cells),
+            "context_chunks": sum(cell["context_chunks"] for cell in cells),
+            "counters": counters,
+            "slowest_cells": [
+                {key: cell.get(key) for key in ("month", "area", "generation_seconds", "time_to_first_token", "response_tokens")}
+                for cell in slowest
+            ],
+        }
+
+    def finish(self):
+        """Пишет сводку в журнал и возвращает ее текстом для консоли."""
+        summary = self.summary()
+        if self.journal:
+            self.journal.record_summary(summary)
+        return format_summary(summary)
+
+def format_summary(summary):
+    estimated = " (оценка по длине текста)" if summary["tokens_estimated"] else ""
+    lines = [
+        f"Сводка прогона: {summary['total_seconds']:.1f} с, сгенерировано ячеек: {summary['cells_generated']}, "
+        f"из кэша LLM: {summary['llm_cache_hits']}.",
+        "  Этапы: " + ", ".join(f"{name} {seconds:.2f} с" for name, seconds in summary["stages"].items()),
+        f"  Токены{estimated}: промпты {summary['prompt_tokens']}, ответы {summary['response_tokens']}, "
+        f"всего {summary['prompt_tokens'] + summary['response_tokens']}.",
+        f"  Чанки: найдено {summary['retrieved_chunks']}, вошло в контекст {summary['context_chunks']}.",
+    ]
+    if summary["counters"]:
+        lines.append("  Счетчики: " + ", ".join(f"{name} {value}" for name, value in summary["counters"].items()))
+    if summary["slowest_cells"]:
+        lines.append("  Самые долгие ячейки:")
+        for cell in summary["slowest_cells"]:
+            first_token = ""
+            if cell["time_to_first_token"] is not None:
+                first_token = f"первый фрагмент через {cell['time_to_first_token']:.2f} с, "
+            lines.append(
+                f"    {cell['month']} / {cell['area']}: {cell['generation_seconds'] or 0:.2f} с "
+                f"({first_token}токенов ответа {cell['response_tokens']})"
+            )
+    return "\n".join(lines)
@@ -0,0 +1,21 @@
+import pytest
+
+from bench_pipeline import latency_stats, percentile
+
+@pytest.mark.parametrize("n, fraction, rank", [
+    (22, 0.5, 11),
+    (21, 0.5, 11),
+    (20, 0.95, 19),
+    (100, 0.95, 95),
+    (100, 0.07, 7),
+    (1, 0.95, 1),
+    (10, 0.0, 1),
+    (10, 1.0, 10),
+])
+def test_percentile_is_nearest_rank(n, fraction, rank):
+    values = list(range(1, n + 1))
+    assert percentile(list(reversed(values)), fraction) == rank
+
+def test_percentile_of_empty_list():
+    assert percentile([], 0.5) is None
+    assert latency_stats([])["p95"] is None
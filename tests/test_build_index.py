@@ -0,0 +1,63 @@
+import json
+import hashlib
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain")
+pytest.importorskip("sentence_transformers")
+
+import build_index
+
+class HashEncoder:
+    """Детерминированные векторы вместо загрузки модели эмбеддингов."""
+
+    def __init__(self, model_name):
+        pass
+
+    def encode(self, texts, show_progress_bar=False):
+        return np.array([np.frombuffer(hashlib.sha256(text.encode("utf-8")).digest()[:32], dtype=np.uint8) for text in texts], dtype="float32")
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("INDEX_TYPE", raising=False)
+    monkeypatch.setattr(build_index, "SentenceTransformer", HashEncoder)
+    (tmp_path / build_index.SOURCE_DATA_FOLDER).mkdir()
+    return tmp_path
+
+def count_splits(monkeypatch):
+    calls = []
+    splitter_class = build_index.RecursiveCharacterTextSplitter
+
+    class CountingSplitter(splitter_class):
+        def split_documents(self, documents):
+            calls.append([doc.metadata["source"] for doc in documents])
+            return super().split_documents(documents)
+
+    monkeypatch.setattr(build_index, "RecursiveCharacterTextSplitter", CountingSplitter)
+    return calls
+
+def load_manifest():
+    with open(build_index.INDEX_MANIFEST_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def test_file_change_without_chunk_change_settles(workdir, monkeypatch):
+    source = workdir / build_index.SOURCE_DATA_FOLDER / "games.txt"
+    text = "Подвижная игра «Воробушки и автомобиль».\n\n" + "".join(f"Круг {number}: дети бегают по площадке. " for number in range(200))
+    source.write_text(text, encoding="utf-8")
+    build_index.main()
+    chunk_ids = load_manifest()["files"]["games.txt"]["chunks"]
+
+    # Пробелы в конце файла меняют его хэш, но не чанки: сплиттер обрезает их.
+    changed_text = text + "\n\n"
+    source.write_text(changed_text, encoding="utf-8")
+    splits = count_splits(monkeypatch)
+    build_index.main()
+    manifest = load_manifest()
+    assert manifest["files"]["games.txt"]["sha256"] == build_index.text_sha256(changed_text)
+    assert manifest["files"]["games.txt"]["chunks"] == chunk_ids
+    assert splits == [["games.txt"]]
+
+    build_index.main()
+    assert splits == [["games.txt"]]
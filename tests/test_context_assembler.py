@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+
+from context_assembler import CONTEXT_SEPARATOR, assemble_context, estimate_tokens
+
+def chunk(text, source):
+    return SimpleNamespace(page_content=text, metadata={"source": source})
+
+def test_separators_count_towards_budget():
+    first = chunk("а" * 300, "first.txt")
+    second = chunk("б" * 300, "second.txt")
+    hits = [[(1, first, 0.9), (2, second, 0.8)]]
+    single = assemble_context(["Тема"], [], [hits[0][:1]], token_budget=0)
+    # Лимит ровно на два фрагмента без разделителя: с разделителем второй уже не помещается.
+    budget = 2 * estimate_tokens(single)
+    stats = {}
+    context = assemble_context(["Тема"], [], hits, token_budget=budget, stats=stats)
+    assert CONTEXT_SEPARATOR not in context
+    assert estimate_tokens(context) <= budget
+    assert stats["over_budget"] == 1
+
+def test_merged_piece_keeps_its_rank_position():
+    shared = "общий край соседних чанков одного файла"
+    best = chunk("Лучший фрагмент. " + shared, "games.txt")
+    second = chunk("Фрагмент другого файла.", "other.txt")
+    neighbour = chunk(shared + " Продолжение лучшего фрагмента.", "games.txt")
+    hits = [[(1, best, 0.9), (2, second, 0.8), (3, neighbour, 0.7)]]
+    stats = {}
+    context = assemble_context(["Тема"], [], hits, token_budget=0, stats=stats)
+    assert stats["merged"] == 1
+    assert context.index("Лучший фрагмент") < context.index("Фрагмент другого файла")
+    assert "Продолжение лучшего фрагмента" in context.split(CONTEXT_SEPARATOR)[0]
@@ -0,0 +1,18 @@
+import pytest
+
+from plan_renderers import PlanRenderer, write_plan_outputs
+
+def test_markdown_escapes_html_in_cells(tmp_path):
+    rows = [("Сентябрь", "Музыка", "Игра <b>«Эхо»</b> & пение | хлопки\nВторая строка", True)]
+    (path,) = write_plan_outputs(str(tmp_path / "plan"), [("Группа", rows)], "2025-2026", ["md"])
+    with open(path, "r", encoding="utf-8") as f:
+        row = f.read().splitlines()[-1]
+    assert row == "| Сентябрь | Музыка | Игра &lt;b&gt;«Эхо»&lt;/b&gt; &amp; пение \\| хлопки<br>Вторая строка |"
+
+def test_renderer_must_implement_add_row(tmp_path):
+    class IncompleteRenderer(PlanRenderer):
+        extension = "txt"
+
+    with pytest.raises(TypeError):
+        IncompleteRenderer(str(tmp_path / "plan.txt"), ["Группа"], "2025-2026")
+    assert not (tmp_path / "plan.txt.part").exists()